@@ -0,0 +1,114 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import CustomUser
+
+SHARED_TOKEN_KEY = "auth:token:{}"
+
+
+class TokenUserCache:
+    """
+    Thread-safe LRU of token key -> user, bounded to `maxsize` entries that
+    each expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, user)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [k for k, (_, user) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenUserCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers which user a token belongs to, so
+    an authenticated request normally costs no query at all.
+
+    Lookups go to this process's LRU, then (with AUTH_TOKEN_SHARED_CACHE)
+    the Django cache, then the database. Deleting a token or saving its
+    user drops the entry here and in the shared cache; other processes'
+    LRUs drop it within AUTH_TOKEN_CACHE_TTL seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None and settings.AUTH_TOKEN_SHARED_CACHE:
+            user = cache.get(SHARED_TOKEN_KEY.format(key))
+            if user is not None:
+                token_cache.set(key, user)
+        if user is None:
+            user, _ = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            if settings.AUTH_TOKEN_SHARED_CACHE:
+                cache.set(SHARED_TOKEN_KEY.format(key), user, timeout=settings.AUTH_TOKEN_SHARED_CACHE_TTL)
+        if not user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        # Each request gets its own copy so nothing it does leaks into the cache
+        return copy.copy(user), key
+
+
+def forget_tokens(keys, user_id=None):
+    keys = list(keys)
+    for key in keys:
+        token_cache.discard(key)
+    if user_id is not None:
+        token_cache.discard_user(user_id)
+    if settings.AUTH_TOKEN_SHARED_CACHE and keys:
+        cache.delete_many([SHARED_TOKEN_KEY.format(key) for key in keys])
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=CustomUser)
+def forget_saved_user(sender, instance, created, **kwargs):
+    # Covers deactivation as well as profile edits the cached copy would miss
+    if not created:
+        forget_tokens(Token.objects.filter(user_id=instance.pk).values_list("key", flat=True), instance.pk)
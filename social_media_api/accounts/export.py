@@ -0,0 +1,97 @@
+import zipfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from notifications.models import ArchivedNotification, Notification
+from posts.models import Comment, Like, Post
+from .models import CustomUser
+
+Follow = CustomUser.following.through
+
+# Personal data export. Every section is read with .iterator(), so rows are
+# fetched EXPORT_CHUNK_SIZE at a time and encoded straight onto the output:
+# memory stays flat however many rows the account has.
+
+
+def export_sections(user):
+    """(section name, values() queryset) pairs, in export order."""
+    return [
+        ("profile", CustomUser.objects.filter(pk=user.pk).values(
+            "id", "username", "email", "bio", "profile_picture", "date_joined",
+            "follower_count", "following_count",
+        )),
+        ("posts", Post.objects.filter(author=user).order_by("id").values(
+            "id", "title", "content", "created_at", "updated_at", "like_count", "comment_count",
+        )),
+        ("comments", Comment.objects.filter(author=user).order_by("id").values(
+            "id", "post_id", "parent_id", "content", "created_at", "updated_at",
+        )),
+        ("likes", Like.objects.filter(user=user).order_by("id").values("post_id", "created_at")),
+        ("following", Follow.objects.filter(from_customuser=user).order_by("id").values(
+            user_id=F("to_customuser_id"), username=F("to_customuser__username"),
+        )),
+        ("followers", Follow.objects.filter(to_customuser=user).order_by("id").values(
+            user_id=F("from_customuser_id"), username=F("from_customuser__username"),
+        )),
+        ("notifications", Notification.objects.filter(recipient=user).order_by("id").values(
+            "id", "verb", "actor_id", "actor_count", "timestamp", "is_read", "target_object_id",
+            target_type=F("target_content_type__model"),
+        )),
+        ("archived_notifications", ArchivedNotification.objects.filter(recipient=user).order_by("id").values(
+            "original_id", "verb", "actor_id", "actor_count", "timestamp", "target_object_id",
+            target_type=F("target_content_type__model"),
+        )),
+    ]
+
+
+def section_lines(rows, **extra):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield (encoder.encode({**extra, **row}) + "\n").encode()
+
+
+def ndjson_export(user):
+    """One JSON object per line, tagged with its section: {"type": "posts", ...}."""
+    for section, rows in export_sections(user):
+        yield from section_lines(rows, type=section)
+
+
+class _StreamBuffer:
+    """Write-only file for ZipFile whose contents are drained as they are produced."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_export(user):
+    """A zip archive with one <section>.ndjson member, streamed as it is built."""
+    buffer = _StreamBuffer()
+    # An unseekable target makes ZipFile write sizes after each member's data
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for section, rows in export_sections(user):
+            with archive.open(f"{section}.ndjson", "w", force_zip64=True) as member:
+                for line in section_lines(rows):
+                    member.write(line)
+                    if buffer.chunks:
+                        yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from posts import cache as post_cache
+from . import graph
+from .models import CustomUser
+
+Follow = CustomUser.following.through  # from_customuser follows to_customuser
+
+
+def follow(follower, followed):
+    """
+    Record that follower follows followed and bump both counters in the
+    same transaction. Returns False if the follow already existed.
+    """
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(
+            from_customuser=follower, to_customuser=followed
+        )
+        if created:
+            CustomUser.objects.filter(pk=follower.pk).update(following_count=F("following_count") + 1)
+            CustomUser.objects.filter(pk=followed.pk).update(follower_count=F("follower_count") + 1)
+            graph.record_follows(follower.pk, [followed.pk])
+            graph.invalidate_follows(follower.pk, [followed.pk])
+    if created:
+        post_cache.bump_authors([follower.pk, followed.pk])  # counts shown on their posts
+    return created
+
+
+def unfollow(follower, followed):
+    """Remove a follow and decrement both counters. Returns False if none existed."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            from_customuser=follower, to_customuser=followed
+        ).delete()
+        if deleted:
+            # Greatest() keeps the counters from going negative if they have drifted
+            CustomUser.objects.filter(pk=follower.pk).update(following_count=Greatest(F("following_count") - 1, Value(0)))
+            CustomUser.objects.filter(pk=followed.pk).update(follower_count=Greatest(F("follower_count") - 1, Value(0)))
+            graph.record_unfollows(follower.pk, [followed.pk])
+            graph.invalidate_follows(follower.pk, [followed.pk])
+    if deleted:
+        post_cache.bump_authors([follower.pk, followed.pk])
+    return bool(deleted)
+
+
+def follow_many(follower, user_ids):
+    """
+    Follow many accounts at once; returns the ids that were newly followed.
+    Unknown ids, the follower's own id and existing follows are skipped.
+    """
+    already_followed = set(
+        Follow.objects.filter(from_customuser=follower, to_customuser_id__in=user_ids)
+        .values_list("to_customuser_id", flat=True)
+    )
+    followed_ids = sorted(
+        CustomUser.objects.filter(id__in=set(user_ids) - already_followed - {follower.pk})
+        .values_list("id", flat=True)
+    )
+    if not followed_ids:
+        return []
+    with transaction.atomic():
+        Follow.objects.bulk_create(
+            [Follow(from_customuser=follower, to_customuser_id=user_id) for user_id in followed_ids],
+            ignore_conflicts=True,  # a concurrent single follow wins; reconcile_counters fixes counts
+        )
+        CustomUser.objects.filter(pk=follower.pk).update(following_count=F("following_count") + len(followed_ids))
+        CustomUser.objects.filter(id__in=followed_ids).update(follower_count=F("follower_count") + 1)
+        graph.record_follows(follower.pk, followed_ids)
+        graph.invalidate_follows(follower.pk, followed_ids)
+    post_cache.bump_authors([follower.pk, *followed_ids])
+    return followed_ids
+
+
+def unfollow_many(follower, user_ids):
+    """Remove many follows at once; returns the ids that were unfollowed."""
+    with transaction.atomic():
+        follows = Follow.objects.select_for_update().filter(from_customuser=follower, to_customuser_id__in=user_ids)
+        unfollowed_ids = sorted(follows.values_list("to_customuser_id", flat=True))
+        if not unfollowed_ids:
+            return []
+        Follow.objects.filter(from_customuser=follower, to_customuser_id__in=unfollowed_ids).delete()
+        CustomUser.objects.filter(pk=follower.pk).update(
+            following_count=Greatest(F("following_count") - len(unfollowed_ids), Value(0))
+        )
+        CustomUser.objects.filter(id__in=unfollowed_ids).update(follower_count=Greatest(F("follower_count") - 1, Value(0)))
+        graph.record_unfollows(follower.pk, unfollowed_ids)
+        graph.invalidate_follows(follower.pk, unfollowed_ids)
+    post_cache.bump_authors([follower.pk, *unfollowed_ids])
+    return unfollowed_ids
@@ -0,0 +1,158 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import CustomUser, FollowSuggestion
+
+Follow = CustomUser.following.through  # from_customuser follows to_customuser
+
+# Each user's followee and follower ids are cached as one set per direction.
+# follow()/unfollow() delete the two affected entries, so a read is at most
+# one indexed scan of the through table.
+FOLLOWING_KEY = "graph:{}:following"
+FOLLOWERS_KEY = "graph:{}:followers"
+
+
+def _cached_ids(key, rows):
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(rows())
+        cache.set(key, ids, timeout=settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+    return frozenset(ids)
+
+
+def following_ids(user_id):
+    """Ids of the accounts user_id follows."""
+    return _cached_ids(
+        FOLLOWING_KEY.format(user_id),
+        lambda: Follow.objects.filter(from_customuser_id=user_id).values_list("to_customuser_id", flat=True),
+    )
+
+
+def follower_ids(user_id):
+    """Ids of the accounts following user_id."""
+    return _cached_ids(
+        FOLLOWERS_KEY.format(user_id),
+        lambda: Follow.objects.filter(to_customuser_id=user_id).values_list("from_customuser_id", flat=True),
+    )
+
+
+def invalidate(keys):
+    def delete():
+        cache.delete_many(keys)
+    # As with post versions: now, and again on commit so a set read from
+    # the pre-commit state in between is dropped too.
+    delete()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(delete)
+
+
+def invalidate_follows(follower_id, followed_ids):
+    invalidate([FOLLOWING_KEY.format(follower_id)] + [FOLLOWERS_KEY.format(i) for i in followed_ids])
+
+
+def invalidate_user(user_id):
+    """Drop a user's own sets and every neighbour's set that mentions them."""
+    keys = [FOLLOWING_KEY.format(user_id), FOLLOWERS_KEY.format(user_id)]
+    keys += [FOLLOWERS_KEY.format(i) for i in following_ids(user_id)]
+    keys += [FOLLOWING_KEY.format(i) for i in follower_ids(user_id)]
+    invalidate(keys)
+
+
+# ----- Friends-of-friends suggestions -----
+def _adjust(pairs, delta):
+    """Add delta to the score of each (user_id, candidate_id) pair, once per occurrence."""
+    counts = Counter((user_id, candidate_id) for user_id, candidate_id in pairs if user_id != candidate_id)
+    if not counts:
+        return
+    if delta > 0:
+        # Make sure the rows exist, then increment in SQL so concurrent
+        # follows never lose an update.
+        FollowSuggestion.objects.bulk_create(
+            [FollowSuggestion(user_id=u, candidate_id=c) for u, c in counts],
+            batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True,
+        )
+    groups = {}  # (user_id, occurrences) -> candidate ids
+    for (user_id, candidate_id), occurrences in counts.items():
+        groups.setdefault((user_id, occurrences), []).append(candidate_id)
+    for (user_id, occurrences), candidate_ids in groups.items():
+        rows = FollowSuggestion.objects.filter(user_id=user_id, candidate_id__in=candidate_ids)
+        rows.update(score=F("score") + delta * occurrences)
+        if delta < 0:
+            rows.filter(score__lte=0).delete()
+
+
+def _follow_paths(follower_id, followed_ids):
+    """
+    The suggestion pairs that follower -> followed edges contribute to:
+    (follower, each followee of a followed user) and (each follower of
+    follower, each followed user). Users with more than
+    FOLLOW_SUGGESTION_FANOUT_LIMIT followees/followers are skipped to bound
+    the work per follow; rebuild_follow_suggestions restores exact scores.
+    """
+    limit = settings.FOLLOW_SUGGESTION_FANOUT_LIMIT
+    pairs = [
+        (follower_id, candidate_id)
+        for candidate_id in Follow.objects.filter(
+            from_customuser_id__in=followed_ids, from_customuser__following_count__lte=limit
+        ).values_list("to_customuser_id", flat=True)
+    ]
+    follower_followers = CustomUser.objects.values_list("follower_count", flat=True).get(pk=follower_id)
+    if follower_followers <= limit:
+        pairs += [
+            (user_id, followed_id)
+            for user_id in Follow.objects.filter(to_customuser_id=follower_id)
+            .values_list("from_customuser_id", flat=True)
+            for followed_id in followed_ids
+        ]
+    return pairs
+
+
+def record_follows(follower_id, followed_ids):
+    _adjust(_follow_paths(follower_id, followed_ids), 1)
+
+
+def record_unfollows(follower_id, followed_ids):
+    _adjust(_follow_paths(follower_id, followed_ids), -1)
+
+
+def suggestions_for(user_id, limit):
+    """
+    Up to `limit` FollowSuggestion rows, best first, leaving out accounts
+    the user already follows.
+    """
+    followed = following_ids(user_id)
+    rows = (
+        FollowSuggestion.objects.filter(user_id=user_id)
+        .select_related("candidate")
+        .order_by("-score", "candidate_id")
+    )
+    suggestions = []
+    for row in rows.iterator(chunk_size=limit * 2):
+        if row.candidate_id not in followed:
+            suggestions.append(row)
+            if len(suggestions) == limit:
+                break
+    return suggestions
+
+
+def rebuild_suggestions(user_id):
+    """Recompute one user's suggestion scores from the follow table."""
+    scores = (
+        Follow.objects.filter(
+            from_customuser_id__in=Follow.objects.filter(from_customuser_id=user_id).values("to_customuser_id")
+        )
+        .exclude(to_customuser_id=user_id)
+        .values("to_customuser_id")
+        .annotate(score=Count("*"))
+        .values_list("to_customuser_id", "score")
+    )
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id=user_id).delete()
+        FollowSuggestion.objects.bulk_create(
+            [FollowSuggestion(user_id=user_id, candidate_id=c, score=s) for c, s in scores],
+            batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        )
@@ -0,0 +1,98 @@
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from posts import cache as post_cache
+from .models import CustomUser
+
+# Uploaded profile pictures are stored untouched; a worker
+# (`manage.py process_profile_pictures`) later renders square variants in
+# each size and format. Variant names embed a hash of their bytes, so a
+# URL's content never changes and it can be cached forever.
+VARIANT_FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 85, "optimize": True})}
+VARIANT_PATH = "profile_pics/variants/{user_id}/{size}-{digest}.{ext}"
+
+
+def render_variants(user_id, image_file):
+    """
+    Write every size/format variant of an image to storage.
+    Returns {"<size>": {"webp": name, "jpeg": name}}.
+    """
+    with Image.open(image_file) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    variants = {}
+    for size in settings.PROFILE_PICTURE_SIZES:
+        square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[str(size)] = {}
+        for ext, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            square.save(buffer, image_format, **options)
+            content = buffer.getvalue()
+            name = VARIANT_PATH.format(
+                user_id=user_id, size=size, digest=hashlib.sha256(content).hexdigest()[:16], ext=ext
+            )
+            if not default_storage.exists(name):  # same bytes, same name: nothing to write
+                default_storage.save(name, ContentFile(content))
+            variants[str(size)][ext] = name
+    return variants
+
+
+def variant_names(variants):
+    return {name for formats in variants.values() for name in formats.values()}
+
+
+def process_user(user):
+    """Render one user's variants; returns False if the upload is not an image."""
+    source = user.profile_picture.name
+    try:
+        with user.profile_picture.open("rb") as image_file:
+            variants = render_variants(user.pk, image_file)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        variants, ok = {}, False
+    else:
+        ok = True
+
+    with transaction.atomic():
+        # Only if the picture wasn't replaced meanwhile; a new upload stays pending
+        updated = CustomUser.objects.filter(
+            pk=user.pk, profile_picture=source, profile_picture_pending=True
+        ).update(profile_picture_variants=variants, profile_picture_pending=False)
+        if updated:
+            post_cache.bump_author(user.pk)  # author summaries inside cached posts
+    if updated:
+        for name in variant_names(user.profile_picture_variants) - variant_names(variants):
+            default_storage.delete(name)
+    return ok
+
+
+def process_pending(batch_size):
+    """Process up to batch_size pending uploads; returns (processed, failed)."""
+    users = list(
+        CustomUser.objects.filter(profile_picture_pending=True)
+        .only("id", "profile_picture", "profile_picture_variants")
+        .order_by("id")[:batch_size]
+    )
+    failed = 0
+    for user in users:
+        if not user.profile_picture:
+            CustomUser.objects.filter(pk=user.pk, profile_picture="").update(profile_picture_pending=False)
+            continue
+        if not process_user(user):
+            failed += 1
+    return len(users), failed
+
+
+def variant_urls(user, request=None):
+    """{"<size>": {"webp": url, "jpeg": url}} for a user's processed variants."""
+    urls = {}
+    for size, formats in (user.profile_picture_variants or {}).items():
+        urls[size] = {}
+        for ext, name in formats.items():
+            url = default_storage.url(name)
+            urls[size][ext] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.export import ndjson_export, zip_export
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Stream a user's personal data export (NDJSON, or a zip with --zip) to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout)")
+        parser.add_argument("--zip", action="store_true", help="Write a zip of per-section NDJSON files")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options["username"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+
+        chunks = zip_export(user) if options["zip"] else ndjson_export(user)
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                written = sum(output.write(chunk) for chunk in chunks)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        else:
+            output = getattr(self.stdout, "buffer", None) or sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
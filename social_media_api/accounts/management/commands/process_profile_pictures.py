@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.images import process_pending
+
+
+class Command(BaseCommand):
+    help = "Render resized WebP/JPEG variants of newly uploaded profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--interval", type=float, default=5.0,
+                            help="Seconds to sleep when nothing is pending")
+        parser.add_argument("--once", action="store_true",
+                            help="Process what is pending and exit instead of polling")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        try:
+            while True:
+                started = time.monotonic()
+                processed = failed = 0
+                while True:
+                    batch, batch_failed = process_pending(batch_size)
+                    if not batch:
+                        break
+                    processed += batch
+                    failed += batch_failed
+                if processed:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"Processed {processed} profile pictures ({failed} unreadable) in {elapsed:.2f}s "
+                        f"({processed / max(elapsed, 1e-6):.1f}/s)"
+                    )
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from accounts.graph import rebuild_suggestions
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Recompute friends-of-friends follow suggestions from the follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild this user's suggestions")
+
+    def handle(self, *args, **options):
+        user_ids = CustomUser.objects.order_by("id").values_list("id", flat=True)
+        if options["user"]:
+            user_ids = user_ids.filter(id=options["user"])
+
+        rebuilt = 0
+        for user_id in user_ids.iterator(chunk_size=500):
+            rebuild_suggestions(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt suggestions for {rebuilt} users."))
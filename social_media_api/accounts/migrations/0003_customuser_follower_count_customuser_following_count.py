@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    # Same as reconcile_counters.count_of, frozen for this migration
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    """Start the counters from the existing follows."""
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = CustomUser._meta.get_field('following').remote_field.through
+    CustomUser.objects.update(
+        follower_count=count_of(Follow, 'to_customuser'),
+        following_count=count_of(Follow, 'from_customuser'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_customuser_followers_customuser_following'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread(apps, schema_editor):
+    """Start the counter from each user's existing unread notifications."""
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Notification = apps.get_model('notifications', 'Notification')
+    # Same as reconcile_counters.count_of, frozen for this migration
+    unread = (
+        Notification.objects.filter(recipient=OuterRef('pk'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    CustomUser.objects.update(unread_notification_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_follower_count_customuser_following_count'),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='unread_notification_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,10 @@ from django.db import models
 class CustomUser(AbstractUser):
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized copies of profile_picture, written by accounts.images off-request:
+    # {"<size>": {"webp": name, "jpeg": name}}. Stale while pending is set.
+    profile_picture_variants = models.JSONField(default=dict, blank=True)
+    profile_picture_pending = models.BooleanField(default=False)
     # followers = models.ManyToManyField(
     #     "self",
     #     symmetrical=False,
@@ -16,7 +20,37 @@ class CustomUser(AbstractUser):
         related_name="followers",  # reverse access: user.followers.all()
         blank=True
     )
+    # Denormalized counters, kept in step with F() updates (see reconcile_counters)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    unread_notification_count = models.PositiveIntegerField(default=0)  # badge count
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # the image worker's queue
+            models.Index(fields=["id"], condition=models.Q(profile_picture_pending=True),
+                         name="user_picture_pending_idx"),
+        ]
 
     def __str__(self):
         return self.username
+
+
+class FollowSuggestion(models.Model):
+    """
+    Friends-of-friends score: how many of `user`'s followees follow
+    `candidate`. Maintained incrementally by accounts.graph on every
+    follow/unfollow (and rebuilt by `manage.py rebuild_follow_suggestions`).
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="follow_suggestions")
+    candidate = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="+")
+    score = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "candidate")
+        indexes = [
+            models.Index(fields=["user", "-score", "candidate"], name="suggestion_user_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} → {self.candidate_id} ({self.score})"
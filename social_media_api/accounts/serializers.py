@@ -1,13 +1,63 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import CustomUser
+from .images import variant_urls
+from .models import CustomUser, FollowSuggestion
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
 
-class UserSerializer(serializers.ModelSerializer):
+class ProfilePictureVariantsMixin(serializers.Serializer):
+    # Empty until the image worker has processed the current upload
+    profile_picture_variants = serializers.SerializerMethodField()
+
+    def get_profile_picture_variants(self, user):
+        if user.profile_picture_pending:
+            return {}
+        return variant_urls(user, self.context.get('request'))
+
+
+class UserSerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
+    # The follower list is served by UserViewSet.followers, not inlined here
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'profile_picture_variants',
+                  'follower_count', 'following_count']
+        read_only_fields = ['follower_count', 'following_count']
+
+
+class UserSummarySerializer(ProfilePictureVariantsMixin, serializers.ModelSerializer):
+    """Compact author representation for posts and comments."""
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'followers']
+        fields = ['id', 'username', 'profile_picture', 'profile_picture_variants',
+                  'follower_count', 'following_count']
+        read_only_fields = fields
+
+
+class FollowListSerializer(UserSummarySerializer):
+    """Entry in a followers/following page, with ?followed_by_me=true."""
+    followed_by_me = serializers.BooleanField(read_only=True)
+
+    class Meta(UserSummarySerializer.Meta):
+        fields = UserSummarySerializer.Meta.fields + ['followed_by_me']
+        read_only_fields = fields
+
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    """A suggested account and how many of the user's followees follow it."""
+    user = UserSummarySerializer(source='candidate', read_only=True)
+    mutual_count = serializers.IntegerField(source='score', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['user', 'mutual_count']
+
+class UserIdsSerializer(serializers.Serializer):
+    """Request body for the bulk follow/unfollow endpoint."""
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+    )
 
 User = get_user_model()
 class RegisterSerializer(serializers.ModelSerializer):
@@ -1,3 +1,415 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from importlib import import_module
+from django.apps import apps as django_apps
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from . import graph
+from .authentication import token_cache
+from .follows import follow
+from .models import CustomUser, FollowSuggestion
+from notifications.models import NotificationOutbox
+from posts.models import Post, TimelineEntry
 
-# Create your tests here.
+
+class FollowCounterTests(APITestCase):
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.bob = CustomUser.objects.create_user(username='bob', password='pass')
+        self.client.force_authenticate(self.alice)
+
+    def assertCounts(self, alice_following, bob_followers):
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.following_count, alice_following)
+        self.assertEqual(self.bob.follower_count, bob_followers)
+
+    def test_follow_is_counted_once(self):
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.assertCounts(1, 1)
+
+    def test_unfollow_decrements(self):
+        self.client.post(reverse('follow-user', args=[self.bob.id]))
+        self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.assertCounts(0, 0)
+
+    def test_follows_from_before_the_counters(self):
+        self.alice.following.add(self.bob)
+
+        backfill = import_module(
+            'accounts.migrations.0003_customuser_follower_count_customuser_following_count'
+        ).backfill_counts
+        backfill(django_apps, None)
+        self.assertCounts(1, 1)
+
+        # A counter that missed the follow never goes below zero
+        CustomUser.objects.update(follower_count=0, following_count=0)
+        response = self.client.post(reverse('unfollow-user', args=[self.bob.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertCounts(0, 0)
+
+
+class FollowSuggestionTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: CustomUser.objects.create_user(username=name, password='pass')
+            for name in ['alice', 'bob', 'carol', 'dave', 'eve']
+        }
+        self.client.force_authenticate(self.users['alice'])
+
+    def follow(self, follower, followed):
+        self.client.force_authenticate(self.users[follower])
+        self.client.post(reverse('follow-user', args=[self.users[followed].id]))
+
+    def unfollow(self, follower, followed):
+        self.client.force_authenticate(self.users[follower])
+        self.client.post(reverse('unfollow-user', args=[self.users[followed].id]))
+
+    def suggestions(self, username):
+        self.client.force_authenticate(self.users[username])
+        response = self.client.get(reverse('user-suggestions'))
+        return [(row['user']['username'], row['mutual_count']) for row in response.data]
+
+    def test_ranks_friends_of_friends_by_mutual_count(self):
+        self.follow('bob', 'carol')
+        self.follow('bob', 'dave')
+        self.follow('eve', 'dave')
+        self.follow('alice', 'bob')
+        self.follow('alice', 'eve')
+
+        self.assertEqual(self.suggestions('alice'), [('dave', 2), ('carol', 1)])
+
+    def test_followed_accounts_are_not_suggested(self):
+        self.follow('bob', 'carol')
+        self.follow('alice', 'bob')
+        self.follow('alice', 'carol')
+
+        self.assertEqual(self.suggestions('alice'), [])
+
+    def test_unfollow_and_new_followers_keep_scores_exact(self):
+        self.follow('alice', 'bob')
+        self.follow('bob', 'carol')   # alice gains carol via bob
+        self.follow('dave', 'alice')
+        self.follow('alice', 'eve')   # dave gains eve via alice
+        self.unfollow('alice', 'bob')
+
+        self.assertEqual(self.suggestions('alice'), [])
+        self.assertEqual(self.suggestions('dave'), [('eve', 1)])
+        incremental = set(FollowSuggestion.objects.values_list('user_id', 'candidate_id', 'score'))
+        for user in self.users.values():
+            graph.rebuild_suggestions(user.id)
+        self.assertEqual(incremental, set(FollowSuggestion.objects.values_list('user_id', 'candidate_id', 'score')))
+
+    def test_follow_invalidates_cached_sets(self):
+        alice, bob = self.users['alice'], self.users['bob']
+        self.assertEqual(graph.following_ids(alice.id), frozenset())
+        self.assertEqual(graph.follower_ids(bob.id), frozenset())
+
+        follow(alice, bob)
+
+        self.assertEqual(graph.following_ids(alice.id), {bob.id})
+        self.assertEqual(graph.follower_ids(bob.id), {alice.id})
+
+
+class BulkFollowTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('bulk-follow')
+
+    def make_contacts(self, count, prefix='contact'):
+        contacts = [CustomUser.objects.create_user(username=f'{prefix}{i}', password='pass') for i in range(count)]
+        for contact in contacts:
+            Post.objects.create(author=contact, title='Hello', content='body')
+        return contacts
+
+    def test_follows_contacts_and_skips_unknown_self_and_existing(self):
+        contacts = self.make_contacts(3)
+        follow(self.alice, contacts[0])
+        ids = [c.id for c in contacts] + [self.alice.id, 9999]
+
+        response = self.client.post(self.url, {'user_ids': ids}, format='json')
+
+        self.assertEqual(response.data['followed'], [contacts[1].id, contacts[2].id])
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 3)
+        self.assertEqual(set(self.alice.following.values_list('id', flat=True)), {c.id for c in contacts})
+        contacts[1].refresh_from_db()
+        self.assertEqual(contacts[1].follower_count, 1)
+        self.assertEqual(NotificationOutbox.objects.filter(verb='followed you').count(), 2)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 2)  # follow() doesn't backfill
+        self.assertEqual(graph.following_ids(self.alice.id), {c.id for c in contacts})
+
+    def test_query_count_does_not_grow_with_contacts(self):
+        few = [c.id for c in self.make_contacts(2)]
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, {'user_ids': few}, format='json')
+        self.client.delete(self.url, {'user_ids': few}, format='json')
+
+        many = [c.id for c in CustomUser.objects.exclude(pk=self.alice.pk)] + [c.id for c in self.make_contacts(20, prefix='more')]
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(self.url, {'user_ids': many}, format='json')
+
+        self.assertEqual(len(response.data['followed']), 22)
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_unfollow(self):
+        contacts = self.make_contacts(3)
+        self.client.post(self.url, {'user_ids': [c.id for c in contacts]}, format='json')
+
+        response = self.client.delete(self.url, {'user_ids': [contacts[0].id, contacts[1].id]}, format='json')
+
+        self.assertEqual(response.data['unfollowed'], [contacts[0].id, contacts[1].id])
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 1)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.token = Token.objects.create(user=self.alice)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('user-suggestions')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql']])
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.url)
+        self.token.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        self.alice.is_active = False
+        self.alice.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(AUTH_TOKEN_SHARED_CACHE=True)
+    def test_shared_cache_serves_other_processes(self):
+        cache.clear()
+        self.client.get(self.url)
+        token_cache.clear()  # as if the next request hit another process
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql']])
+
+        self.token.delete()
+        token_cache.clear()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class LoginThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.url = reverse('login')
+
+    def attempt(self, username, password='wrong', ip='10.0.0.1'):
+        return self.client.post(self.url, {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_username_is_limited_across_ips(self):
+        codes = [self.attempt('alice', ip=f'10.0.0.{i}').status_code for i in range(6)]
+
+        self.assertEqual(codes, [400] * 5 + [429])
+        self.assertEqual(self.attempt('ALICE', password='pass', ip='10.0.1.1').status_code, 429)
+
+    def test_ip_is_limited_across_usernames(self):
+        codes = [self.attempt(f'user{i}').status_code for i in range(21)]
+
+        self.assertEqual(codes[-1], 429)
+        self.assertEqual(self.attempt('alice', password='pass', ip='10.0.0.2').status_code, 200)
+
+    def test_rejections_are_counted_for_staff(self):
+        for _ in range(7):
+            self.attempt('alice')
+        staff = CustomUser.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.client.force_authenticate(staff)
+
+        stats = self.client.get(reverse('throttle-stats')).data
+
+        self.assertEqual(stats['rejected']['login_username'], 2)
+        self.assertEqual(stats['password_hashes'], 5)
+        self.assertGreaterEqual(stats['hash_seconds_saved'], 0)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get(reverse('throttle-stats')).status_code, 403)
+
+
+class FollowListTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.star = CustomUser.objects.create_user(username='star', password='pass')
+        self.viewer = CustomUser.objects.create_user(username='viewer', password='pass')
+        self.fans = [CustomUser.objects.create_user(username=f'fan{i}', password='pass') for i in range(7)]
+        for fan in self.fans:
+            follow(fan, self.star)
+        follow(self.viewer, self.fans[6])
+        self.client.force_authenticate(self.viewer)
+        self.url = reverse('user-followers', args=[self.star.id])
+
+    def test_followers_are_paginated_compact_summaries(self):
+        first = self.client.get(self.url, {'page_size': 4}).data
+        second = self.client.get(first['next']).data
+
+        names = [u['username'] for u in first['results'] + second['results']]
+        self.assertEqual(names, [f'fan{i}' for i in range(6, -1, -1)])
+        self.assertIsNone(second['next'])
+        self.assertEqual(set(first['results'][0]), {'id', 'username', 'profile_picture', 'profile_picture_variants',
+                                                    'follower_count', 'following_count'})
+
+    def test_followed_by_me_is_computed_in_the_page_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'followed_by_me': 'true'})
+
+        marks = {u['username']: u['followed_by_me'] for u in response.data['results']}
+        self.assertTrue(marks['fan6'])
+        self.assertFalse(marks['fan5'])
+        self.assertEqual(len([q for q in queries if 'accounts_customuser_following' in q['sql']]), 1)
+
+    def test_following_lists_followees(self):
+        response = self.client.get(reverse('user-following', args=[self.fans[0].id]))
+
+        self.assertEqual([u['username'] for u in response.data['results']], ['star'])
+
+
+class ProfilePictureVariantTests(APITestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('user-detail', args=[self.alice.id])
+
+    def upload(self, content, name='me.png'):
+        picture = SimpleUploadedFile(name, content, content_type='image/png')
+        return self.client.patch(self.url, {'profile_picture': picture}, format='multipart')
+
+    def png(self, size=(800, 600)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_upload_is_processed_off_request(self):
+        response = self.upload(self.png())
+        self.assertEqual(response.data['profile_picture_variants'], {})
+        self.alice.refresh_from_db()
+        self.assertTrue(self.alice.profile_picture_pending)
+
+        call_command('process_profile_pictures', '--once', stdout=io.StringIO())
+
+        data = self.client.get(self.url).data
+        self.assertEqual(set(data['profile_picture_variants']), {'64', '256'})
+        self.assertTrue(data['profile_picture_variants']['64']['webp'].endswith('.webp'))
+        self.alice.refresh_from_db()
+        self.assertFalse(self.alice.profile_picture_pending)
+        with default_storage.open(self.alice.profile_picture_variants['64']['jpeg']) as variant:
+            self.assertEqual(Image.open(variant).size, (64, 64))
+
+    def test_variant_names_depend_only_on_content(self):
+        self.upload(self.png())
+        call_command('process_profile_pictures', '--once', stdout=io.StringIO())
+        self.alice.refresh_from_db()
+        first = self.alice.profile_picture_variants
+
+        self.upload(self.png(), name='again.png')
+        call_command('process_profile_pictures', '--once', stdout=io.StringIO())
+        self.alice.refresh_from_db()
+
+        self.assertEqual(self.alice.profile_picture_variants, first)
+        self.assertTrue(default_storage.exists(first['256']['webp']))
+
+    def test_unreadable_upload_is_not_retried(self):
+        CustomUser.objects.filter(pk=self.alice.pk).update(
+            profile_picture='profile_pics/missing.png', profile_picture_pending=True
+        )
+
+        out = io.StringIO()
+        call_command('process_profile_pictures', '--once', stdout=out)
+
+        self.alice.refresh_from_db()
+        self.assertFalse(self.alice.profile_picture_pending)
+        self.assertEqual(self.alice.profile_picture_variants, {})
+        self.assertIn('1 unreadable', out.getvalue())
+
+
+class DataExportTests(APITestCase):
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username='alice', password='pass')
+        self.bob = CustomUser.objects.create_user(username='bob', password='pass')
+        follow(self.alice, self.bob)
+        follow(self.bob, self.alice)
+        for i in range(5):
+            Post.objects.create(author=self.alice, title=f'Post {i}', content='body')
+        Post.objects.create(author=self.bob, title='Not mine', content='body')
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('profile-export')
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_export_streams_every_section(self):
+        response = self.client.get(self.url)
+
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        by_type = {}
+        for row in rows:
+            by_type.setdefault(row['type'], []).append(row)
+        self.assertEqual(by_type['profile'][0]['username'], 'alice')
+        self.assertEqual([r['title'] for r in by_type['posts']], [f'Post {i}' for i in range(5)])
+        self.assertEqual(by_type['following'], [{'type': 'following', 'user_id': self.bob.id, 'username': 'bob'}])
+        self.assertEqual(by_type['followers'][0]['username'], 'bob')
+
+    def test_zip_export_has_one_member_per_section(self):
+        response = self.client.get(self.url, {'as': 'zip'})
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('posts.ndjson', archive.namelist())
+        posts = archive.read('posts.ndjson').decode().splitlines()
+        self.assertEqual(len(posts), 5)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+    def test_command_writes_export_file(self):
+        path = tempfile.mktemp(suffix='.ndjson')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        call_command('export_user_data', 'alice', '--output', path, stderr=io.StringIO())
+
+        with open(path) as export:
+            types = [json.loads(line)['type'] for line in export]
+        self.assertEqual(types.count('posts'), 5)
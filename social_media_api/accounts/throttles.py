@@ -0,0 +1,83 @@
+import hashlib
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle
+
+# Throttles on the password endpoints reject a request before the view
+# runs, i.e. before authenticate()/create_user() spend CPU on a password
+# hash. These cache counters record how often that happened and how long
+# a hash takes, so the time saved can be reported (see ThrottleStatsView).
+REJECTED_KEY = "throttle:{}:rejected"
+HASH_COUNT_KEY = "auth:hash:count"
+HASH_MICROS_KEY = "auth:hash:micros"
+
+
+def incr(key, delta=1):
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+@contextmanager
+def timed_password_hash():
+    """Time a block that hashes a password (authenticate(), create_user())."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        incr(HASH_COUNT_KEY)
+        incr(HASH_MICROS_KEY, int((time.perf_counter() - started) * 1_000_000))
+
+
+class PasswordEndpointThrottle(SimpleRateThrottle):
+    """Sliding-window throttle (the cache keeps each key's recent request times)."""
+
+    def throttle_failure(self):
+        incr(REJECTED_KEY.format(self.scope))
+        return False
+
+
+class LoginIPThrottle(PasswordEndpointThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginUsernameThrottle(PasswordEndpointThrottle):
+    """Limits attempts on one account however many IPs they come from."""
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not isinstance(username, str) or not username:
+            return None
+        ident = hashlib.sha256(username.lower().encode()).hexdigest()  # cache-key safe
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class RegisterIPThrottle(LoginIPThrottle):
+    scope = "register_ip"
+
+
+THROTTLE_SCOPES = [LoginIPThrottle.scope, LoginUsernameThrottle.scope, RegisterIPThrottle.scope]
+
+
+def throttle_stats():
+    counters = cache.get_many(
+        [REJECTED_KEY.format(scope) for scope in THROTTLE_SCOPES] + [HASH_COUNT_KEY, HASH_MICROS_KEY]
+    )
+    rejected = {scope: counters.get(REJECTED_KEY.format(scope), 0) for scope in THROTTLE_SCOPES}
+    hashes = counters.get(HASH_COUNT_KEY, 0)
+    average = counters.get(HASH_MICROS_KEY, 0) / hashes / 1_000_000 if hashes else 0.0
+    return {
+        "rejected": rejected,
+        "password_hashes": hashes,
+        "average_hash_seconds": round(average, 6),
+        "hash_seconds_saved": round(sum(rejected.values()) * average, 3),
+    }
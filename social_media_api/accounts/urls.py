@@ -1,5 +1,5 @@
 from django.urls import include, path
-from .views import RegisterView, LoginView, ProfileView, UserViewSet, FollowUserView, UnfollowUserView
+from .views import RegisterView, LoginView, ProfileView, UserViewSet, FollowUserView, UnfollowUserView, BulkFollowView, ThrottleStatsView, DataExportView
 from rest_framework.routers import DefaultRouter
 
 router= DefaultRouter()
@@ -9,7 +9,10 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name="register"),
     path('login/', LoginView.as_view(), name="login"),
     path('profile/', ProfileView.as_view(), name="profile"),
+    path('profile/export/', DataExportView.as_view(), name="profile-export"),
+    path('throttle-stats/', ThrottleStatsView.as_view(), name="throttle-stats"),
     path('', include(router.urls)), 
+    path("follow/bulk/", BulkFollowView.as_view(), name="bulk-follow"),
     path("follow/<int:user_id>/", FollowUserView.as_view(), name="follow-user"),
     path("unfollow/<int:user_id>/", UnfollowUserView.as_view(), name="unfollow-user"),
 ]
\ No newline at end of file
@@ -3,22 +3,37 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
 from .models import CustomUser
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from .serializers import (RegisterSerializer, LoginSerializer, UserSerializer, UserSummarySerializer,
+                          FollowListSerializer, FollowSuggestionSerializer, UserIdsSerializer)
 from rest_framework.decorators import action
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from notifications.models import Notification
 from django.contrib.contenttypes.models import ContentType
+from notifications.models import NotificationOutbox
+from notifications.outbox import enqueue, enqueue_many
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.db.models import Exists, OuterRef
+from social_media_api.pagination import KeysetPagination
+from posts.timeline import backfill_timeline, remove_from_timeline
+from .export import ndjson_export, zip_export
+from .follows import Follow, follow, unfollow, follow_many, unfollow_many
+from .throttles import LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle, throttle_stats, timed_password_hash
+from . import graph
+from posts import cache as post_cache
 
 # User Registration
 class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = RegisterSerializer
+    throttle_classes = [RegisterIPThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        with timed_password_hash():
+            user = serializer.save()
 
         # Create a token for the new user
         token, created = Token.objects.get_or_create(user=user)
@@ -30,9 +45,13 @@ class RegisterView(generics.CreateAPIView):
 
 # User Login & Token
 class LoginView(APIView):
+    # Checked before post(), so rejected attempts never reach authenticate()
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
     def post(self, request, *args, **kwargs):
         serializer = LoginSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with timed_password_hash():
+            serializer.is_valid(raise_exception=True)
         user = serializer.validated_data
         token, created = Token.objects.get_or_create(user=user)
         return Response({
@@ -40,12 +59,37 @@ class LoginView(APIView):
             "user": UserSerializer(user).data
         })
 
+# Personal data export, streamed
+class DataExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """Everything stored about the user as NDJSON, or a zip of per-section files with ?as=zip"""
+        stamp = timezone.now().strftime("%Y%m%d")
+        if request.query_params.get("as") == "zip":
+            response = StreamingHttpResponse(zip_export(request.user), content_type="application/zip")
+            filename = f"{request.user.username}-{stamp}.zip"
+        else:
+            response = StreamingHttpResponse(ndjson_export(request.user), content_type="application/x-ndjson")
+            filename = f"{request.user.username}-{stamp}.ndjson"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+# Login/register throttling counters, for staff
+class ThrottleStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(throttle_stats())
+
 # Get current logged-in user profile
 class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        # request.user may come from the token cache; counters are updated in SQL
+        user = CustomUser.objects.get(pk=request.user.pk)
+        serializer = UserSerializer(user)
         return Response(serializer.data)
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -53,22 +97,55 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    
-
-    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def perform_update(self, serializer):
+        if "profile_picture" in serializer.validated_data:
+            # variants are rendered by `manage.py process_profile_pictures`
+            user = serializer.save(profile_picture_pending=bool(serializer.validated_data["profile_picture"]))
+        else:
+            user = serializer.save()
+        post_cache.bump_author(user.pk)  # author summaries are cached inside posts
+
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        graph.invalidate_user(user_id)  # the cascade removes their follows
+        instance.delete()
+        post_cache.bump_author(user_id)
+
+    def follow_page(self, users):
+        """One keyset page of users, newest accounts first, as compact summaries."""
+        serializer_class = UserSummarySerializer
+        if self.request.query_params.get("followed_by_me") in ("1", "true"):
+            # Part of the page query itself, so no extra query per user
+            users = users.annotate(followed_by_me=Exists(
+                Follow.objects.filter(from_customuser=self.request.user, to_customuser=OuterRef("pk"))
+            ))
+            serializer_class = FollowListSerializer
+        page = self.paginate_queryset(users.order_by("-id"))
+        return self.get_paginated_response(serializer_class(page, many=True).data)
+
+    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated],
+            pagination_class=KeysetPagination)
     def followers(self, request, pk=None):
-        """List followers of a user"""
+        """List followers of a user (?followed_by_me=true marks accounts you follow)"""
         user = self.get_object()
-        followers = user.followers.all()
-        serializer = UserSerializer(followers, many=True)
-        return Response(serializer.data)
+        return self.follow_page(user.followers.all())
 
-    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated],
+            pagination_class=KeysetPagination)
     def following(self, request, pk=None):
         """List users this user is following"""
         user = self.get_object()
-        following = user.following.all()
-        serializer = UserSerializer(following, many=True)
+        return self.follow_page(user.following.all())
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def suggestions(self, request):
+        """Who to follow: friends of friends, ranked by mutual connections (?limit=, max 100)"""
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        suggestions = graph.suggestions_for(request.user.id, limit)
+        serializer = FollowSuggestionSerializer(suggestions, many=True)
         return Response(serializer.data)
     
 class FollowUserView(generics.GenericAPIView):
@@ -77,12 +154,11 @@ class FollowUserView(generics.GenericAPIView):
     
     @staticmethod
     def create_follow_notification(follower, followed_user):
-        Notification.objects.create(
+        enqueue(
             recipient=followed_user,
             actor=follower,
             verb="followed you",
-            target_content_type=ContentType.objects.get_for_model(follower),
-            target_object_id=follower.id
+            target=follower
         )
 
     def post(self, request, user_id):
@@ -93,8 +169,10 @@ class FollowUserView(generics.GenericAPIView):
             return Response({"detail": "You cannot follow yourself."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.following.add(user_to_follow)
-        self.create_follow_notification(request.user, user_to_follow)
+        with transaction.atomic():
+            if follow(request.user, user_to_follow):
+                backfill_timeline(request.user, [user_to_follow.id])
+                self.create_follow_notification(request.user, user_to_follow)
     
         return Response({"detail": f"You are now following {user_to_follow.username}."},
                         status=status.HTTP_200_OK)
@@ -112,7 +190,44 @@ class UnfollowUserView(generics.GenericAPIView):
             return Response({"detail": "You cannot unfollow yourself."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        request.user.following.remove(user_to_unfollow)
+        if unfollow(request.user, user_to_unfollow):
+            remove_from_timeline(request.user, [user_to_unfollow.id])
         return Response({"detail": f"You have unfollowed {user_to_unfollow.username}."},
                         status=status.HTTP_200_OK)    
     
+
+
+class BulkFollowView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserIdsSerializer
+
+    def post(self, request):
+        """Follow up to 500 users in one request (e.g. a contact import)"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user_type = ContentType.objects.get_for_model(CustomUser)
+        with transaction.atomic():
+            followed = follow_many(request.user, serializer.validated_data["user_ids"])
+            backfill_timeline(request.user, followed)
+            enqueue_many([
+                NotificationOutbox(
+                    recipient_id=user_id,
+                    actor=request.user,
+                    verb="followed you",
+                    target_content_type=user_type,
+                    target_object_id=request.user.pk,
+                )
+                for user_id in followed
+            ])
+        return Response({"followed": followed}, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        """Unfollow up to 500 users in one request"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        unfollowed = unfollow_many(request.user, serializer.validated_data["user_ids"])
+        if unfollowed:
+            remove_from_timeline(request.user, unfollowed)
+        return Response({"unfollowed": unfollowed}, status=status.HTTP_200_OK)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver pending notifications from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to sleep when the outbox is empty")
+        parser.add_argument("--once", action="store_true",
+                            help="Drain what is pending and exit instead of polling")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        try:
+            while True:
+                started = time.monotonic()
+                delivered = 0
+                while processed := drain(batch_size):
+                    delivered += processed
+                if delivered:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"Delivered {delivered} notifications in {elapsed:.2f}s "
+                        f"({delivered / max(elapsed, 1e-6):.0f}/s)"
+                    )
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.models import ArchivedNotification, Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive (or delete) read notifications older than the retention period, "
+        "in short transactions so the notifications table is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help="Keep read notifications newer than this many days")
+        parser.add_argument("--delete", action="store_true",
+                            help="Delete expired rows instead of archiving them")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0,
+                            help="Seconds to pause between chunks to let other writers in")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        expired = Notification.objects.filter(is_read=True, timestamp__lt=cutoff)
+        chunk_size = options["chunk_size"]
+
+        moved = chunks = 0
+        lock_time = longest_lock = 0.0
+        started = time.monotonic()
+        position = None  # (timestamp, id) of the last row looked at
+        while True:
+            candidates = expired.order_by("timestamp", "id")
+            if position:
+                candidates = candidates.filter(
+                    Q(timestamp__gt=position[0]) | Q(timestamp=position[0], id__gt=position[1])
+                )
+            keys = list(candidates.values_list("timestamp", "id")[:chunk_size])
+            if not keys:
+                break
+            position = keys[-1]
+
+            lock_started = time.monotonic()
+            with transaction.atomic():
+                # Rows locked by a concurrent writer are left for the next run
+                rows = list(
+                    Notification.objects.select_for_update(skip_locked=True)
+                    .filter(id__in=[row_id for _, row_id in keys], is_read=True)
+                )
+                if not options["delete"]:
+                    ArchivedNotification.objects.bulk_create(
+                        [self.archived(row) for row in rows], ignore_conflicts=True
+                    )
+                Notification.objects.filter(id__in=[row.id for row in rows]).delete()
+            held = time.monotonic() - lock_started
+            lock_time += held
+            longest_lock = max(longest_lock, held)
+            moved += len(rows)
+            chunks += 1
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        elapsed = time.monotonic() - started
+        action = "Deleted" if options["delete"] else "Archived"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {moved} notifications in {chunks} chunks, {elapsed:.2f}s "
+            f"({moved / max(elapsed, 1e-6):.0f} rows/s); locks held {lock_time:.3f}s total, "
+            f"{longest_lock:.3f}s longest"
+        ))
+
+    @staticmethod
+    def archived(row):
+        return ArchivedNotification(
+            original_id=row.id,
+            recipient_id=row.recipient_id,
+            actor_id=row.actor_id,
+            verb=row.verb,
+            target_content_type_id=row.target_content_type_id,
+            target_object_id=row.target_object_id,
+            timestamp=row.timestamp,
+            actor_count=row.actor_count,
+            recent_actors=row.recent_actors,
+        )
@@ -3,6 +3,27 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
+class NotificationQuerySet(models.QuerySet):
+    def with_targets(self):
+        """
+        Load actors with a join and targets with one query per content type,
+        including what each target's __str__ needs, so target_repr costs no
+        extra queries per row.
+        """
+        from django.contrib.auth import get_user_model
+        from django.contrib.contenttypes.prefetch import GenericPrefetch
+        from posts.models import Comment, Like, Post
+
+        return self.select_related("actor").prefetch_related(
+            GenericPrefetch("target", [
+                Post.objects.only("id", "title"),
+                Comment.objects.select_related("author", "post"),
+                Like.objects.select_related("user", "post"),
+                get_user_model().objects.all(),
+            ])
+        )
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
@@ -24,8 +45,68 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    # Coalescing: repeated (recipient, verb, target) events inside
+    # NOTIFICATION_COALESCE_SECONDS fold into one unread row.
+    # actor is the most recent actor; recent_actors holds a small sample.
+    # actor_count is approximate: repeats are only recognised while the actor
+    # is still in recent_actors, so someone who unlikes and likes again after
+    # NOTIFICATION_RECENT_ACTORS others is counted twice. It feeds "alice and
+    # N others"; don't use it where an exact count matters.
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)  # [{"id": 1, "username": "alice"}, ...]
+
+    objects = NotificationQuerySet.as_manager()
+
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["recipient", "-timestamp", "-id"], name="notif_recipient_ts_idx"),
+            # unread list and mark_all_as_read
+            models.Index(fields=["recipient", "is_read", "-timestamp", "-id"], name="notif_recipient_unread_idx"),
+            models.Index(
+                fields=["recipient", "target_content_type", "target_object_id", "verb"],
+                name="notif_coalesce_idx",
+            ),
+            # retention: read rows, oldest first (see prune_notifications)
+            models.Index(fields=["timestamp", "id"], condition=models.Q(is_read=True), name="notif_read_ts_idx"),
+        ]
 
     def __str__(self):
         return f"{self.actor} {self.verb} {self.target} → {self.recipient}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    A read notification moved out of the hot table by
+    `manage.py prune_notifications` once it passed the retention period.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+")
+    target_object_id = models.PositiveIntegerField()
+    timestamp = models.DateTimeField()
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.actor_id} {self.verb} → {self.recipient_id} (archived)"
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting to be delivered. Rows are written in the same
+    transaction as the like/comment/follow that caused them and turned into
+    Notification rows in batches by `manage.py process_notification_outbox`.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name="+")
+    target_object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.actor_id} {self.verb} → {self.recipient_id} (pending)"
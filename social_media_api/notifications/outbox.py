@@ -0,0 +1,135 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification, NotificationOutbox
+from .stream import get_broker
+
+
+def outbox_entry(recipient, actor, verb, target):
+    return NotificationOutbox(
+        recipient=recipient,
+        actor=actor,
+        verb=verb,
+        target_content_type=ContentType.objects.get_for_model(target),  # cached per process
+        target_object_id=target.pk,
+    )
+
+
+def enqueue(recipient, actor, verb, target):
+    """Record a notification to be delivered by the outbox worker."""
+    entry = outbox_entry(recipient, actor, verb, target)
+    entry.save()
+    return entry
+
+
+def enqueue_many(entries, batch_size=500):
+    """Record many NotificationOutbox entries with one bulk insert."""
+    return NotificationOutbox.objects.bulk_create(entries, batch_size=batch_size)
+
+
+def coalesce_key(item):
+    return (item.recipient_id, item.verb, item.target_content_type_id, item.target_object_id)
+
+
+def merge_actors(new_actors, recent_actors):
+    """Newest first, without duplicates, capped at NOTIFICATION_RECENT_ACTORS."""
+    merged, seen = [], set()
+    for actor in new_actors + recent_actors:
+        if actor["id"] not in seen:
+            seen.add(actor["id"])
+            merged.append(actor)
+    return merged[:settings.NOTIFICATION_RECENT_ACTORS]
+
+
+def deliver(entries):
+    """
+    Turn outbox entries into notifications, folding events that share a
+    (recipient, verb, target) into one row: an unread notification from
+    the coalescing window is updated in place, otherwise one is created.
+    Must run inside a transaction. Returns (created, updated) lists.
+    """
+    groups = {}
+    for entry in entries:  # oldest first
+        groups.setdefault(coalesce_key(entry), []).append(entry.actor_id)
+
+    actor_ids = {entry.actor_id for entry in entries}
+    usernames = dict(
+        get_user_model().objects.filter(id__in=actor_ids).values_list("id", "username")
+    )
+
+    now = timezone.now()
+    window_start = now - timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS)
+    candidates = Notification.objects.select_for_update().filter(
+        is_read=False,
+        timestamp__gte=window_start,
+        recipient_id__in={key[0] for key in groups},
+        target_object_id__in={key[3] for key in groups},
+        verb__in={key[1] for key in groups},
+    ).order_by("timestamp")
+    open_notifications = {coalesce_key(n): n for n in candidates}  # latest wins
+
+    created, updated = [], []
+    for key, group_actor_ids in groups.items():
+        latest_first = list(dict.fromkeys(reversed(group_actor_ids)))
+        new_actors = [{"id": actor_id, "username": usernames.get(actor_id, "")} for actor_id in latest_first]
+        notification = open_notifications.get(key)
+        if notification:
+            # Only the capped sample is known, so actor_count is approximate (see the model)
+            already_counted = {actor["id"] for actor in notification.recent_actors}
+            notification.actor_id = latest_first[0]
+            notification.actor_count += len([a for a in latest_first if a not in already_counted])
+            notification.recent_actors = merge_actors(new_actors, notification.recent_actors)
+            notification.timestamp = now
+            updated.append(notification)
+        else:
+            recipient_id, verb, content_type_id, object_id = key
+            created.append(Notification(
+                recipient_id=recipient_id,
+                actor_id=latest_first[0],
+                verb=verb,
+                target_content_type_id=content_type_id,
+                target_object_id=object_id,
+                actor_count=len(latest_first),
+                recent_actors=merge_actors(new_actors, []),
+            ))
+
+    Notification.objects.bulk_create(created)
+    Notification.objects.bulk_update(
+        updated, ["actor", "actor_count", "recent_actors", "timestamp"]
+    )
+
+    # Coalesced rows were already unread; only new rows raise the badge count
+    new_per_recipient = {}
+    for notification in created:
+        new_per_recipient[notification.recipient_id] = new_per_recipient.get(notification.recipient_id, 0) + 1
+    User = get_user_model()
+    for recipient_id, count in new_per_recipient.items():
+        User.objects.filter(pk=recipient_id).update(
+            unread_notification_count=F("unread_notification_count") + count
+        )
+    return created, updated
+
+
+def drain(batch_size=500):
+    """
+    Deliver one batch of pending notifications. Locked rows are skipped so
+    several workers can drain the outbox concurrently. Returns the number
+    of entries processed.
+    """
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+        )
+        if not entries:
+            return 0
+        created, updated = deliver(entries)
+        NotificationOutbox.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        events = [(n.recipient_id, n.id) for n in created + updated]
+        transaction.on_commit(lambda: get_broker().publish_many(events))
+    return len(entries)
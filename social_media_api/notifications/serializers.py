@@ -5,14 +5,32 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.CharField(source="actor.username", read_only=True)
     target_repr = serializers.StringRelatedField(source="target")
+    recent_actors = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = [
             "id",
             "actor_username",
+            "actor_count",
+            "recent_actors",
             "verb",
+            "summary",
             "target_repr",
             "timestamp",
             "is_read"
         ]
+
+    def get_recent_actors(self, obj):
+        return [actor["username"] for actor in obj.recent_actors]
+
+    def get_summary(self, obj):
+        # e.g. "alice and 41 others liked your post"
+        names = [actor["username"] for actor in obj.recent_actors] or [obj.actor.username]
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{names[0]} {obj.verb}"
+        if others == 1 and len(names) > 1:
+            return f"{names[0]} and {names[1]} {obj.verb}"
+        return f"{names[0]} and {others} others {obj.verb}"
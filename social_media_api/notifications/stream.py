@@ -0,0 +1,224 @@
+import asyncio
+import select
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+# ----- Pub/sub brokers -----
+class LocalBroker:
+    """
+    In-process pub/sub: each open stream registers an asyncio queue per
+    user. publish() may be called from any thread. Events only reach
+    streams in the same process, so streams also catch up with one cheap
+    query per heartbeat (see `shared`).
+    """
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> {(loop, queue)}
+
+    def subscribe(self, user_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, notification_id):
+        self.dispatch(user_id, notification_id)
+
+    def publish_many(self, events):
+        for user_id, notification_id in events:
+            self.publish(user_id, notification_id)
+
+    def dispatch(self, user_id, notification_id):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, notification_id)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Shares events between processes with PostgreSQL LISTEN/NOTIFY.
+    publish() sends a NOTIFY; one listener thread per process receives
+    them and dispatches to that process's local subscribers.
+    """
+    shared = True
+    channel = "notifications"
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, user_id):
+        self.start_listener()
+        return super().subscribe(user_id)
+
+    def publish_many(self, events):
+        with connections["default"].cursor() as cursor:
+            for user_id, notification_id in events:
+                cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, f"{user_id}:{notification_id}"])
+
+    def publish(self, user_id, notification_id):
+        self.publish_many([(user_id, notification_id)])
+
+    def start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, name="notification-listener", daemon=True)
+                self._listener.start()
+
+    def listen(self):
+        wrapper = connections["default"]
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        while True:
+            if select.select([connection], [], [], 60) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                payload = connection.notifies.pop(0).payload
+                user_id, _, notification_id = payload.partition(":")
+                self.dispatch(int(user_id), int(notification_id))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker named by settings.NOTIFICATION_BROKER."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.NOTIFICATION_BROKER)()
+        return _broker
+
+
+# ----- Server-Sent Events endpoint -----
+def release_connections():
+    """
+    Close this thread's database connections. All of a stream's
+    sync_to_async calls run in one thread and Django only closes its
+    connections when the request finishes, so an idle stream would
+    otherwise hold a connection for as long as the client is connected.
+    """
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+
+
+def authenticate_stream(request):
+    """
+    Resolve the token from the Authorization header or, since EventSource
+    cannot send headers, from ?token=.
+    """
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    key = header[6:].strip() if header.startswith("Token ") else request.GET.get("token")
+    if not key:
+        return None
+    try:
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            authenticator = authentication_class()
+            if hasattr(authenticator, "authenticate_credentials"):
+                try:
+                    user, _ = authenticator.authenticate_credentials(key)
+                except AuthenticationFailed:
+                    return None
+                return user
+        return None
+    finally:
+        release_connections()
+
+
+def notifications_since(user_id, since, exclude_ids=()):
+    """New or re-coalesced notifications from `since` on, oldest first."""
+    try:
+        notifications = (
+            Notification.objects.filter(recipient_id=user_id, timestamp__gte=since)
+            .exclude(id__in=exclude_ids)
+            .with_targets()
+            .order_by("timestamp", "id")[:settings.NOTIFICATION_STREAM_BATCH]
+        )
+        return [(n.id, n.timestamp, NotificationSerializer(n).data) for n in notifications]
+    finally:
+        release_connections()
+
+
+def format_event(timestamp, data):
+    payload = JSONRenderer().render(data).decode()
+    return f"id: {timestamp.isoformat()}\nevent: notification\ndata: {payload}\n\n"
+
+
+async def event_stream(user_id, since):
+    broker = get_broker()
+    subscriber = broker.subscribe(user_id)
+    _, queue = subscriber
+    fetch = sync_to_async(notifications_since)
+    sent_at_since = set()  # ids already sent whose timestamp equals `since`
+    try:
+        yield "retry: 5000\n\n"
+        wake = True  # send anything missed since Last-Event-ID straight away
+        while True:
+            if wake:
+                for notification_id, timestamp, data in await fetch(user_id, since, sent_at_since):
+                    if timestamp > since:
+                        since, sent_at_since = timestamp, set()
+                    sent_at_since.add(notification_id)
+                    yield format_event(timestamp, data)
+            try:
+                await asyncio.wait_for(queue.get(), timeout=settings.NOTIFICATION_STREAM_HEARTBEAT)
+                while not queue.empty():  # one fetch for a burst of events
+                    queue.get_nowait()
+                wake = True
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                wake = not broker.shared  # local broker: catch up on other processes' events
+    finally:
+        broker.unsubscribe(user_id, subscriber)
+
+
+async def notification_stream(request):
+    """
+    GET /api/notifications/stream/ - Server-Sent Events stream of the
+    user's notifications. Needs an ASGI server (see social_media_api/asgi.py).
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI buffers a streamed async iterator to the end, which for this
+        # endless stream would hold a worker and grow forever.
+        return JsonResponse({"detail": "The notification stream needs an ASGI server."}, status=501)
+    user = await sync_to_async(authenticate_stream)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        since = parse_datetime(request.headers.get("Last-Event-ID", "")) or timezone.now()
+    except ValueError:
+        since = timezone.now()
+    response = StreamingHttpResponse(event_stream(user.id, since), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
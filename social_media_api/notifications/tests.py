@@ -1,3 +1,246 @@
+from datetime import timedelta
+from io import StringIO
+from importlib import import_module
+from unittest import mock
+from django.apps import apps as django_apps
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from accounts.models import CustomUser
+from posts.models import Comment, Like, Post
+from .models import ArchivedNotification, Notification, NotificationOutbox
+from .outbox import drain
+from .stream import get_broker
 
-# Create your tests here.
+
+class NotificationOutboxTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.fan = CustomUser.objects.create_user(username='fan', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        self.client.force_authenticate(self.fan)
+
+    def test_requests_only_write_outbox_rows(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'Hi'})
+        self.client.post(reverse('follow-user', args=[self.author.id]))
+
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_worker_delivers_and_clears_the_outbox(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(reverse('follow-user', args=[self.author.id]))
+
+        call_command('process_notification_outbox', once=True, batch_size=1, stdout=StringIO())
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+        verbs = set(Notification.objects.filter(recipient=self.author).values_list('verb', flat=True))
+        self.assertEqual(verbs, {'liked your post', 'followed you'})
+
+
+class CoalescedNotificationTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Viral', content='body')
+        self.fans = [CustomUser.objects.create_user(username=f'fan{i}', password='pass') for i in range(5)]
+
+    def like_as(self, user):
+        self.client.force_authenticate(user)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+
+    def test_likes_on_one_post_fold_into_one_notification(self):
+        for fan in self.fans[:3]:
+            self.like_as(fan)
+        drain()
+        for fan in self.fans[3:]:
+            self.like_as(fan)
+        drain()
+
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.actor, self.fans[4])
+        self.assertEqual([a['username'] for a in notification.recent_actors], ['fan4', 'fan3', 'fan2'])
+
+        self.client.force_authenticate(self.author)
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.data['results'][0]['summary'], 'fan4 and 4 others liked your post')
+
+    def test_read_notifications_are_not_reopened(self):
+        self.like_as(self.fans[0])
+        drain()
+        Notification.objects.update(is_read=True)
+        self.like_as(self.fans[1])
+        drain()
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+
+class NotificationStreamTests(TestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.fan = CustomUser.objects.create_user(username='fan', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Live', content='body')
+        self.token = Token.objects.create(user=self.author)
+        self.url = reverse('notification-stream')
+
+    def notify(self):
+        return Notification.objects.create(
+            recipient=self.author, actor=self.fan, verb='liked your post', target=self.post
+        )
+
+    async def test_stream_requires_a_token(self):
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 401)
+
+    def test_stream_is_refused_under_wsgi(self):
+        response = self.client.get(self.url, {'token': self.token.key})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_sends_missed_then_published_notifications(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        missed = await sync_to_async(self.notify)()
+
+        response = await self.async_client.get(
+            self.url, {'token': self.token.key}, headers={'Last-Event-ID': since}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+        self.assertIn(f'"id":{missed.id},'.encode(), await anext(events))
+
+        live = await sync_to_async(self.notify)()
+        get_broker().publish(self.author.id, live.id)
+        self.assertIn(f'"id":{live.id},'.encode(), await anext(events))
+        await events.aclose()
+
+    async def test_idle_stream_holds_no_connection(self):
+        close = mock.patch.object(type(connections['default']), 'close', autospec=True, side_effect=lambda conn: None)
+        with close as closed:
+            response = await self.async_client.get(self.url, {'token': self.token.key})
+            events = aiter(response.streaming_content)
+            await anext(events)  # retry:
+            self.assertTrue(closed.called)  # authentication and the catch-up fetch
+            closed.reset_mock()
+            live = await sync_to_async(self.notify)()
+            get_broker().publish(self.author.id, live.id)
+            await anext(events)
+            self.assertTrue(closed.called)  # the fetch woken by the event
+            await events.aclose()
+
+
+class UnreadCountTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='body') for i in range(3)]
+        self.fans = [CustomUser.objects.create_user(username=f'fan{i}', password='pass') for i in range(2)]
+        for fan in self.fans:
+            self.client.force_authenticate(fan)
+            for post in self.posts:
+                self.client.post(f'/api/posts/{post.id}/like/')
+        drain()
+        self.client.force_authenticate(self.author)
+
+    def unread_count(self):
+        return self.client.get(reverse('notification-unread-count')).data['unread_count']
+
+    def test_counter_tracks_new_notifications_not_coalesced_events(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread_count(), 3)
+
+    def test_mark_as_read_decrements_once(self):
+        notification = Notification.objects.filter(recipient=self.author).first()
+        url = reverse('notification-mark-as-read', args=[notification.id])
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(self.unread_count(), 2)
+
+    def test_mark_all_as_read_resets(self):
+        self.client.post(reverse('notification-mark-all-as-read'))
+        self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(len(self.client.get(reverse('notification-unread')).data['results']), 0)
+
+    def test_migration_counts_existing_unread_notifications(self):
+        CustomUser.objects.update(unread_notification_count=0)
+        backfill = import_module('accounts.migrations.0004_customuser_unread_notification_count').backfill_unread
+        backfill(django_apps, None)
+        self.assertEqual(self.unread_count(), 3)
+
+
+class NotificationTargetPrefetchTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        self.client.force_authenticate(self.author)
+        self.url = reverse('notification-list')
+
+    def add_activity(self, username):
+        fan = CustomUser.objects.create_user(username=username, password='pass')
+        comment = Comment.objects.create(post=self.post, author=fan, content='Hi')
+        like = Like.objects.create(post=self.post, user=fan)
+        for verb, target in [('liked your post', self.post), ('commented on your post', comment),
+                             ('followed you', fan), ('liked', like)]:
+            Notification.objects.create(recipient=self.author, actor=fan, verb=verb, target=target)
+
+    def queries_for_page(self):
+        self.client.get(self.url)  # warm the ContentType cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page_size': 50})
+        return len(queries), response
+
+    def test_page_cost_does_not_grow_with_rows(self):
+        self.add_activity('fan0')
+        few, _ = self.queries_for_page()
+        for i in range(1, 4):
+            self.add_activity(f'fan{i}')
+        many, response = self.queries_for_page()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['results']), 16)
+        self.assertIn('Comment by fan3 on Post', [n['target_repr'] for n in response.data['results']])
+
+
+class PruneNotificationsTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.fan = CustomUser.objects.create_user(username='fan', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        old = timezone.now() - timedelta(days=100)
+        self.old_read = [self.notify(old, is_read=True) for _ in range(5)]
+        self.old_unread = self.notify(old, is_read=False)
+        self.recent_read = self.notify(timezone.now(), is_read=True)
+
+    def notify(self, timestamp, is_read):
+        notification = Notification.objects.create(
+            recipient=self.author, actor=self.fan, verb='liked your post', target=self.post, is_read=is_read
+        )
+        Notification.objects.filter(pk=notification.pk).update(timestamp=timestamp)
+        return notification
+
+    def test_archives_only_expired_read_notifications(self):
+        out = StringIO()
+        call_command('prune_notifications', '--days', '90', '--chunk-size', '2', stdout=out)
+
+        remaining = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {self.old_unread.id, self.recent_read.id})
+        archived = ArchivedNotification.objects.order_by('original_id')
+        self.assertEqual([a.original_id for a in archived], [n.id for n in self.old_read])
+        self.assertEqual(archived[0].verb, 'liked your post')
+        self.assertIn('Archived 5 notifications in 3 chunks', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_delete_mode_skips_the_archive(self):
+        call_command('prune_notifications', '--delete', stdout=StringIO())
+
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(ArchivedNotification.objects.exists())
@@ -1,11 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import NotificationViewSet
+from .stream import notification_stream
 
 router = DefaultRouter()
-router.register(r'/notifications/', NotificationViewSet, basename='notification')
+router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
+    # before the router, so "stream" is not taken for a notification pk
+    path("notifications/stream/", notification_stream, name="notification-stream"),
     path("", include(router.urls)),
     
    
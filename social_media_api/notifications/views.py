@@ -1,32 +1,57 @@
 # notifications/views.py
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Notification
 from .serializers import NotificationSerializer
+from accounts.models import CustomUser
+from social_media_api.pagination import KeysetPagination
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination  # keyed on (timestamp, id) via Meta.ordering
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).with_targets()
     
+    @staticmethod
+    def decrement_unread(user, count):
+        # Greatest() keeps the counter from going negative if it has drifted
+        CustomUser.objects.filter(pk=user.pk).update(
+            unread_notification_count=Greatest(F("unread_notification_count") - count, Value(0))
+        )
+
     @action(detail=False, methods=["get"])
     def unread(self, request):
         """Fetch only unread notifications"""
         unread_qs = self.get_queryset().filter(is_read=False)
-        serializer = self.get_serializer(unread_qs, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(unread_qs)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def unread_count(self, request):
+        """Badge count, read from the per-user counter (no table scan)"""
+        count = CustomUser.objects.values_list("unread_notification_count", flat=True).get(pk=request.user.pk)
+        return Response({"unread_count": count})
 
     @action(detail=True, methods=["post"])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        with transaction.atomic():
+            # Only the request that flips is_read adjusts the counter
+            if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+                self.decrement_unread(request.user, 1)
         return Response({"detail": "Notification marked as read."})
 
     @action(detail=False, methods=["post"])
     def mark_all_as_read(self, request):
-        self.get_queryset().update(is_read=True)
+        with transaction.atomic():
+            marked = self.get_queryset().filter(is_read=False).update(is_read=True)
+            if marked:
+                self.decrement_unread(request.user, marked)
         return Response({"detail": "All notifications marked as read."})
@@ -0,0 +1,132 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Serialized posts are cached under keys that embed a per-post and a
+# per-author version. Anything that changes a post's representation bumps
+# one of those versions, so invalidation is a single cache write and old
+# entries are simply never read again (they age out via POST_CACHE_TIMEOUT).
+POST_VERSION_KEY = "post:{}:version"
+AUTHOR_VERSION_KEY = "author:{}:version"
+POST_AUTHOR_KEY = "post:{}:author"
+POST_DATA_KEY = "post:{}:{}:{}"
+
+
+def new_version():
+    # Time-based, so a version evicted from the cache is never reissued
+    # and cannot resurrect data cached under it.
+    return time.time_ns()
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, new_version(), timeout=None)  # add() never overwrites a concurrent bump
+    if missing:
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def bump(keys):
+    def write():
+        cache.set_many({key: new_version() for key in keys}, timeout=None)
+    # Bump now, and again once the surrounding transaction commits, so a
+    # reader that cached pre-commit data in between is invalidated too.
+    write()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(write)
+
+
+def bump_post(post_id):
+    bump([POST_VERSION_KEY.format(post_id)])
+
+
+def bump_posts(post_ids):
+    bump([POST_VERSION_KEY.format(post_id) for post_id in post_ids])
+
+
+def bump_author(author_id):
+    bump([AUTHOR_VERSION_KEY.format(author_id)])
+
+
+def bump_authors(author_ids):
+    bump([AUTHOR_VERSION_KEY.format(author_id) for author_id in author_ids])
+
+
+def author_of(post_id, lookup):
+    """A post's author never changes, so the mapping is cached without a version."""
+    key = POST_AUTHOR_KEY.format(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = lookup(post_id)
+        cache.set(key, author_id, timeout=settings.POST_CACHE_TIMEOUT)
+    return author_id
+
+
+def authors_of(post_ids, lookup):
+    """author_of() for many posts; lookup(missing_ids) returns {post_id: author_id}."""
+    keys = {post_id: POST_AUTHOR_KEY.format(post_id) for post_id in post_ids}
+    cached = cache.get_many(list(keys.values()))
+    authors = {post_id: cached[key] for post_id, key in keys.items() if key in cached}
+    missing = [post_id for post_id in post_ids if post_id not in authors]
+    if missing:
+        found = lookup(missing)
+        cache.set_many(
+            {keys[post_id]: author_id for post_id, author_id in found.items()},
+            timeout=settings.POST_CACHE_TIMEOUT,
+        )
+        authors.update(found)
+    return authors
+
+
+def get_row_versions(posts):
+    """[(post_id, post version, author version)] for (post_id, author_id) pairs."""
+    keys = []
+    for post_id, author_id in posts:
+        keys += [POST_VERSION_KEY.format(post_id), AUTHOR_VERSION_KEY.format(author_id)]
+    versions = get_versions(list(dict.fromkeys(keys)))
+    return [
+        (post_id, versions[POST_VERSION_KEY.format(post_id)], versions[AUTHOR_VERSION_KEY.format(author_id)])
+        for post_id, author_id in posts
+    ]
+
+
+def get_post_payloads(posts, build):
+    """
+    Read-through cache for serialized posts.
+
+    posts is a list of (post_id, author_id) pairs; build(post_ids) must
+    return {post_id: data} for the ids that were not cached (ids it
+    cannot find are left out). Returns {post_id: data}.
+    """
+    version_keys = set()
+    for post_id, author_id in posts:
+        version_keys.add(POST_VERSION_KEY.format(post_id))
+        version_keys.add(AUTHOR_VERSION_KEY.format(author_id))
+    versions = get_versions(list(version_keys))
+
+    data_keys = {
+        post_id: POST_DATA_KEY.format(
+            post_id,
+            versions[POST_VERSION_KEY.format(post_id)],
+            versions[AUTHOR_VERSION_KEY.format(author_id)],
+        )
+        for post_id, author_id in posts
+    }
+    cached = cache.get_many(list(data_keys.values()))
+    payloads = {
+        post_id: cached[key] for post_id, key in data_keys.items() if key in cached
+    }
+
+    missing = [post_id for post_id in data_keys if post_id not in payloads]
+    if missing:
+        built = build(missing)
+        cache.set_many(
+            {data_keys[post_id]: data for post_id, data in built.items()},
+            timeout=settings.POST_CACHE_TIMEOUT,
+        )
+        payloads.update(built)
+    return payloads
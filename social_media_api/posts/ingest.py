@@ -0,0 +1,98 @@
+import itertools
+import json
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from accounts.models import CustomUser
+from .models import Post
+from .serializers import PostSerializer
+from .timeline import fan_out_posts
+
+# Bulk post import, shared by the bulk endpoint and `manage.py import_posts`.
+# Records (one JSON object per line) are validated a batch at a time; each
+# valid batch is inserted with one bulk_create and fanned out to followers'
+# timelines in the same transaction, so a batch is imported entirely or not
+# at all and memory never holds more than one batch.
+
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportStats:
+    def __init__(self):
+        self.created = 0
+        self.invalid = 0
+        self.errors = []  # the first MAX_REPORTED_ERRORS {"line", "errors"} entries
+        self.started = time.monotonic()
+
+    def add_error(self, line, errors):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.created / max(self.elapsed, 1e-6)
+
+
+def read_json_lines(lines):
+    """(line number, record or None) for each non-blank line of NDJSON text or bytes."""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def import_posts(numbered_records, author=None, batch_size=None, stats=None):
+    """
+    Import (line number, record) pairs in batches of batch_size, yielding
+    the running ImportStats after each committed batch.
+
+    Every post belongs to `author` if given; otherwise each record names its
+    author by username in "author" (used by the management command).
+    """
+    batch_size = batch_size or settings.POST_IMPORT_BATCH_SIZE
+    stats = stats or ImportStats()
+    records = iter(numbered_records)
+    while batch := list(itertools.islice(records, batch_size)):
+        posts = build_posts(batch, author, stats)
+        with transaction.atomic():
+            Post.objects.bulk_create(posts, batch_size=batch_size)
+            fan_out_posts(posts)
+        stats.created += len(posts)
+        yield stats
+
+
+def build_posts(batch, author, stats):
+    """Validate one batch; returns unsaved Posts and records the failures in stats."""
+    authors = {}
+    if author is None:
+        usernames = {r.get("author") for _, r in batch if r and isinstance(r.get("author"), str)}
+        authors = {u.username: u for u in CustomUser.objects.filter(username__in=usernames)}
+
+    posts = []
+    for line, record in batch:
+        if record is None:
+            stats.add_error(line, {"non_field_errors": ["Not a JSON object."]})
+            continue
+        post_author = author or authors.get(record.get("author"))
+        if post_author is None:
+            stats.add_error(line, {"author": ["Unknown user."]})
+            continue
+        serializer = PostSerializer(data=record)
+        if not serializer.is_valid():
+            stats.add_error(line, serializer.errors)
+            continue
+        posts.append(Post(author=post_author, **serializer.validated_data))
+    return posts
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from posts.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized feed timelines from the current follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild this user's timeline")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by("id")
+        if options["user"]:
+            users = users.filter(id=options["user"])
+
+        total = 0
+        for user in users.iterator(chunk_size=500):
+            total += rebuild_timeline(user)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} timeline entries."))
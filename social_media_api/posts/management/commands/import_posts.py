@@ -0,0 +1,47 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from posts.ingest import ImportStats, import_posts, read_json_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts from a JSON-lines file ({\"author\": username, \"title\": ..., "
+        "\"content\": ...} per line), one transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSON-lines file, or - for stdin")
+        parser.add_argument("--author", help="Import every post as this user instead of each line's author")
+        parser.add_argument("--batch-size", type=int, default=settings.POST_IMPORT_BATCH_SIZE,
+                            help="Posts validated, inserted and fanned out per transaction")
+
+    def handle(self, *args, **options):
+        author = None
+        if options["author"]:
+            try:
+                author = CustomUser.objects.get(username=options["author"])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"No user named {options['author']!r}")
+
+        source = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8")
+        stats = ImportStats()
+        try:
+            for _ in import_posts(read_json_lines(source), author, options["batch_size"], stats):
+                self.stdout.write(
+                    f"{stats.created} posts imported, {stats.invalid} invalid "
+                    f"({stats.rate:.0f} posts/s)"
+                )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        for error in stats.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.created} posts in {stats.elapsed:.2f}s ({stats.rate:.0f} posts/s); "
+            f"{stats.invalid} lines rejected."
+        ))
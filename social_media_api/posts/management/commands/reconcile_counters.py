@@ -0,0 +1,69 @@
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from notifications.models import Notification
+from posts import cache as post_cache
+from posts.models import Comment, Like, Post
+
+Follow = CustomUser.following.through
+
+
+def count_of(model, field, **filters):
+    """Correlated COUNT(*) of model rows whose `field` points at the outer row."""
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+# (model, counter column, actual value)
+COUNTERS = [
+    (Post, "like_count", lambda: count_of(Like, "post")),
+    (Post, "comment_count", lambda: count_of(Comment, "post")),
+    (Comment, "reply_count", lambda: count_of(Comment, "parent")),
+    (CustomUser, "follower_count", lambda: count_of(Follow, "to_customuser")),
+    (CustomUser, "following_count", lambda: count_of(Follow, "from_customuser")),
+    (CustomUser, "unread_notification_count",
+     lambda: count_of(Notification, "recipient", is_read=False)),
+]
+
+# Cached payloads that show a model's counters (comments are not cached)
+CACHE_BUMPS = {
+    Post: post_cache.bump_posts,
+    CustomUser: post_cache.bump_authors,
+}
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/reply/follow/unread counters and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Rows checked per UPDATE statement")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        for model, column, actual in COUNTERS:
+            last_id = model.objects.aggregate(last=Max("id"))["last"] or 0
+            fixed = 0
+            # Walk the table in primary-key ranges so each UPDATE only
+            # touches (and locks) one short batch of rows.
+            for start in range(1, last_id + 1, batch_size):
+                drifted = list(
+                    model.objects.filter(id__gte=start, id__lt=start + batch_size)
+                    .exclude(**{column: actual()})
+                    .values_list("id", flat=True)
+                )
+                if not drifted:
+                    continue
+                fixed += model.objects.filter(id__in=drifted).update(**{column: actual()})
+                if model in CACHE_BUMPS:
+                    CACHE_BUMPS[model](drifted)  # so no cached post shows the old count
+            self.stdout.write(f"{model.__name__}.{column}: fixed {fixed} rows")
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
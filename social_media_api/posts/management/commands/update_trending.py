@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.trending import decay_and_prune
+
+
+class Command(BaseCommand):
+    help = "Decay trending scores and prune posts that have gone cold. Run every few minutes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Repeat every this many seconds instead of running once")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                decayed, pruned = decay_and_prune()
+                self.stdout.write(f"Decayed {decayed} trending posts, pruned {pruned}.")
+                if not options["interval"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    # Same as reconcile_counters.count_of, frozen for this migration
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    """Start the counters from the existing likes and comments."""
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(
+        like_count=count_of(apps.get_model('posts', 'Like'), 'post'),
+        comment_count=count_of(apps.get_model('posts', 'Comment'), 'post'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_comment_comment_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,19 @@
 from django.db import models
 from django.conf import settings
 
+
+class PostQuerySet(models.QuerySet):
+    def with_like_state(self, user):
+        """Annotate liked_by_me for a whole page with one EXISTS subquery."""
+        if not user.is_authenticated:
+            return self.annotate(liked_by_me=models.Value(False))
+        return self.annotate(
+            liked_by_me=models.Exists(
+                Like.objects.filter(post=models.OuterRef("pk"), user=user)
+            )
+        )
+
+
 class Post(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
@@ -11,6 +24,18 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)  # set on creation
     updated_at = models.DateTimeField(auto_now=True)      # updated automatically
+    # Denormalized counters, kept in step with F() updates (see reconcile_counters)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination: (created_at, id), optionally per author
+            models.Index(fields=["-created_at", "-id"], name="post_created_idx"),
+            models.Index(fields=["author", "-created_at", "-id"], name="post_author_created_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -30,6 +55,26 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Reply threads as materialized paths (see posts/threads.py): ordering a
+    # post's comments by path lists the tree depth-first, and a subtree is
+    # one path range.
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        related_name="replies",
+        null=True,
+        blank=True
+    )
+    path = models.CharField(max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)  # direct replies
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="comment_created_idx"),
+            models.Index(fields=["post", "-created_at", "-id"], name="comment_post_created_idx"),
+            models.Index(fields=["post", "path"], name="comment_post_path_idx"),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
@@ -51,4 +96,50 @@ class Like(models.Model):
         unique_together = ("user", "post")  # Prevent duplicate likes
 
     def __str__(self):
-        return f"{self.user.username} liked {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} liked {self.post.title}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post materialized into a follower's feed (fan-out-on-write).
+    created_at is copied from the post so a feed page is one index range.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,  # deleting a post clears it from every feed
+        related_name="timeline_entries"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="timeline_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post.title} in {self.user.username}'s feed"
+
+
+class TrendingPost(models.Model):
+    """
+    A post's time-decayed engagement score. Like/comment events add to it
+    (see posts/trending.py); `manage.py update_trending` decays every row
+    and prunes the ones that have gone cold.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="trending")
+    score = models.FloatField(default=0)
+    decayed_at = models.DateTimeField(null=True, blank=True)  # last update_trending run; null if newer
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "-post"], name="trending_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score:.2f}"
@@ -0,0 +1,72 @@
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# The search index lives outside the ORM (see migration 0006_post_search_index):
+#   PostgreSQL - posts_post.search_vector, a generated tsvector with a GIN index
+#   SQLite     - posts_post_fts, an FTS5 table maintained by triggers
+# On SQLite, a migration that rebuilds posts_post drops those triggers, so it
+# has to recreate them.
+SQLITE_FTS_TABLE = "posts_post_fts"
+
+
+def fts5_query(terms):
+    """Quote each term so user input is matched literally, not as FTS5 syntax."""
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search behind the usual ?search= parameter.
+
+    Matching posts are annotated with `search_rank` and ordered by
+    (-search_rank, -id), which KeysetPagination uses as its cursor key.
+    Backends without a full-text index fall back to SearchFilter's
+    icontains matching over `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        vendor = connections[queryset.db].vendor
+        if vendor == "postgresql":
+            queryset = self.postgres_search(queryset, " ".join(terms))
+        elif vendor == "sqlite":
+            queryset = self.sqlite_search(queryset, fts5_query(terms))
+        else:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.order_by("-search_rank", "-id")
+
+    def postgres_search(self, queryset, text):
+        table = queryset.model._meta.db_table
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.filter(
+            RawSQL(f"{table}.search_vector @@ {tsquery}", [text], output_field=BooleanField())
+        ).annotate(
+            # ts_rank() is float4, which psycopg2 returns as rounded text; as
+            # float8 the value in the cursor compares equal to the column, so
+            # the keyset filter (which reuses this expression) is exact.
+            search_rank=RawSQL(
+                f"ts_rank({table}.search_vector, {tsquery})::float8", [text], output_field=FloatField()
+            )
+        )
+
+    def sqlite_search(self, queryset, match):
+        table = queryset.model._meta.db_table
+        fts = SQLITE_FTS_TABLE
+        return queryset.filter(
+            RawSQL(
+                f"{table}.id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)",
+                [match], output_field=BooleanField(),
+            )
+        ).annotate(
+            # bm25() is lower-is-better; negate it so rank sorts like ts_rank
+            search_rank=RawSQL(
+                f"(SELECT -bm25({fts}, 2.0, 1.0) FROM {fts} "
+                f"WHERE {fts} MATCH %s AND {fts}.rowid = {table}.id)",
+                [match], output_field=FloatField(),
+            )
+        )
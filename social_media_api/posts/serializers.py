@@ -1,20 +1,57 @@
 from rest_framework import serializers
 from .models import Post, Comment
-from accounts.serializers import UserSerializer  # import your custom user serializer
+from .threads import can_reply_to
+from accounts.serializers import UserSummarySerializer
+from social_media_api.fieldsets import SparseFieldsetMixin
 
 
-class PostSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)  # nested user details
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """?fields= trims the output; author is only nested with ?expand=author then."""
+    expandable_fields = ("author",)
+    author = UserSummarySerializer(read_only=True)  # compact author, no follower list
+    # Filled by PostQuerySet.with_like_state(); False when not annotated
+    liked_by_me = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Post
-        fields = ["id", "author", "title", "content", "created_at", "updated_at"]
+        fields = ["id", "author", "title", "content", "created_at", "updated_at",
+                  "like_count", "comment_count", "liked_by_me"]
+        read_only_fields = ["like_count", "comment_count"]
+
+
+class PostIdsSerializer(serializers.Serializer):
+    """Request body for the bulk like/unlike endpoint."""
+    post_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)  # nested user details
+    author = UserSummarySerializer(read_only=True)  # compact author, no follower list
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())  # only post ID
 
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(), required=False, allow_null=True
+    )  # reply to this comment
+
     class Meta:
         model = Comment
-        fields = ["id", "post", "author", "content", "created_at", "updated_at"]
+        fields = ["id", "post", "parent", "author", "content", "depth", "reply_count",
+                  "created_at", "updated_at"]
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            # A comment's place in its thread is fixed once it exists
+            if attrs.get("post", self.instance.post) != self.instance.post or \
+                    attrs.get("parent", self.instance.parent) != self.instance.parent:
+                raise serializers.ValidationError("Comments cannot be moved.")
+            return attrs
+        parent = attrs.get("parent")
+        if parent is not None:
+            if parent.post_id != attrs["post"].id:
+                raise serializers.ValidationError({"parent": "Reply must be on the same post."})
+            if not can_reply_to(parent):
+                raise serializers.ValidationError({"parent": "This thread is too deep to reply to."})
+        return attrs
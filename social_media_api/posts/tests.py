@@ -1,3 +1,721 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from importlib import import_module
+from django.apps import apps as django_apps
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from accounts.follows import follow
+from accounts.models import CustomUser
+from notifications.models import Notification
+from notifications.outbox import drain
+from datetime import timedelta
+from django.utils import timezone
+from .models import Comment, Like, Post, TimelineEntry, TrendingPost
+from .trending import decay_and_prune
+from . import threads
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .timeline import fan_out_post
+from rest_framework.exceptions import ValidationError
+from social_media_api.pagination import KeysetPagination
 
-# Create your tests here.
+
+class FeedTimelineTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('follow-user', args=[self.author.id]))
+
+    def create_post(self, title):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('post-list'), {'title': title, 'content': 'body'})
+        self.client.force_authenticate(self.reader)
+        return Post.objects.get(id=response.data['id'])
+
+    def feed_titles(self):
+        response = self.client.get(reverse('feed-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        post = self.create_post('Hello')
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.feed_titles(), ['Hello'])
+
+    def test_deleted_post_leaves_the_feed(self):
+        post = self.create_post('Gone soon')
+        post.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_titles(), [])
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        self.client.post(reverse('unfollow-user', args=[self.author.id]))
+        self.create_post('Earlier post')
+        self.assertEqual(self.feed_titles(), [])
+
+        self.client.post(reverse('follow-user', args=[self.author.id]))
+        self.assertEqual(self.feed_titles(), ['Earlier post'])
+
+        self.client.post(reverse('unfollow-user', args=[self.author.id]))
+        self.assertEqual(self.feed_titles(), [])
+
+    @override_settings(FEED_FANOUT_FOLLOWER_LIMIT=0)
+    def test_high_fanout_author_is_merged_at_read_time(self):
+        self.create_post('Popular')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed_titles(), ['Popular'])
+
+    def test_timeline_page_is_read_without_joining_posts(self):
+        self.create_post('Hello')
+        with CaptureQueriesContext(connection) as queries:
+            self.feed_titles()
+        timeline_sql = [q['sql'] for q in queries if 'posts_timelineentry' in q['sql']]
+        self.assertEqual(len(timeline_sql), 1)
+        self.assertNotIn('posts_post', timeline_sql[0])
+
+    def test_pages_merge_timeline_and_pulled_authors(self):
+        for i in range(3):
+            self.create_post(f'Fanned {i}')
+        with override_settings(FEED_FANOUT_FOLLOWER_LIMIT=0):
+            # already in the timeline, and now also pulled at read time
+            for i in range(3):
+                self.create_post(f'Pulled {i}')
+
+            pages, url = [], reverse('feed-list')
+            while url:
+                response = self.client.get(url, {'page_size': 2} if not pages else None)
+                pages.append([post['title'] for post in response.data['results']])
+                url = response.data['next']
+
+        self.assertEqual(pages, [
+            ['Pulled 2', 'Pulled 1'], ['Pulled 0', 'Fanned 2'], ['Fanned 1', 'Fanned 0'],
+        ])
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='writer', password='pass')
+        self.posts = [
+            Post.objects.create(author=self.user, title=f'Post {i}', content='body')
+            for i in range(7)
+        ]
+        self.url = reverse('post-list')
+
+    def ids(self, response):
+        return [post['id'] for post in response.data['results']]
+
+    def test_pages_follow_cursor_without_overlap(self):
+        first = self.client.get(self.url, {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+
+        newest_first = [post.id for post in reversed(self.posts)]
+        self.assertEqual(self.ids(first) + self.ids(second) + self.ids(third), newest_first)
+        self.assertIsNone(first.data['previous'])
+        self.assertIsNone(third.data['next'])
+        self.assertNotIn('count', first.data)
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(self.url, {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(self.ids(back), self.ids(first))
+
+    def test_ordering_param_is_used_as_the_key(self):
+        response = self.client.get(self.url, {'ordering': 'created_at', 'page_size': 2})
+        following = self.client.get(response.data['next'])
+        self.assertEqual(self.ids(response) + self.ids(following), [post.id for post in self.posts[:4]])
+
+    def test_feed_ignores_orderings_it_cannot_page_on(self):
+        self.client.force_authenticate(self.user)
+        for ordering in ['author', 'liked_by_me']:
+            response = self.client.get(reverse('feed-list'), {'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_relation_key_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            KeysetPagination().get_key(Post.objects.order_by('author'))
+
+    def test_count_is_opt_in(self):
+        response = self.client.get(self.url, {'count': 'approx'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        crafted = [
+            {'v': 'garbage', 'id': 1},
+            {'v': {'a': 1}, 'id': 1},
+            {'v': None, 'id': 1},
+            {'v': '2020-01-01T00:00:00', 'id': 'x'},
+        ]
+        for data in crafted:
+            cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, data)
+
+
+class AuthorSummaryTests(APITestCase):
+
+    def setUp(self):
+        self.fan = CustomUser.objects.create_user(username='fan', password='pass')
+        for i in range(3):
+            author = CustomUser.objects.create_user(username=f'author{i}', password='pass')
+            follow(self.fan, author)
+            Post.objects.create(author=author, title=f'Post {i}', content='body')
+
+    def test_post_list_uses_compact_author_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('post-list'))
+        author = response.data['results'][0]['author']
+        self.assertNotIn('followers', author)
+        self.assertEqual(author['follower_count'], 1)
+
+    def test_followers_action_still_lists_followers(self):
+        self.client.force_authenticate(self.fan)
+        author = CustomUser.objects.get(username='author0')
+        response = self.client.get(reverse('user-followers', args=[author.id]))
+        self.assertEqual([user['username'] for user in response.data['results']], ['fan'])
+
+
+class CounterTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Counted', content='body')
+        self.client.force_authenticate(self.reader)
+
+    def test_like_and_unlike_update_like_count(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.delete(f'/api/posts/{self.post.id}/unlike/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_create_and_delete_update_comment_count(self):
+        response = self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'Nice'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        self.client.delete(reverse('comment-detail', args=[response.data['id']]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_rows_from_before_the_counters(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='Old')
+        Like.objects.create(user=self.reader, post=self.post)
+
+        backfill = import_module('posts.migrations.0005_post_comment_count_post_like_count').backfill_counts
+        backfill(django_apps, None)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        # A counter that missed those rows never goes below zero
+        Post.objects.filter(pk=self.post.pk).update(like_count=0, comment_count=0)
+        self.assertEqual(self.client.delete(f'/api/posts/{self.post.id}/unlike/').status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.delete(reverse('comment-detail', args=[comment.id])).status_code,
+            status.HTTP_204_NO_CONTENT,
+        )
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_reconcile_counters_fixes_drift(self):
+        Like.objects.create(user=self.reader, post=self.post)
+        self.author.following.add(self.reader)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.reader.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertEqual(self.reader.follower_count, 1)
+
+    def test_reconcile_counters_invalidates_cached_posts(self):
+        url = reverse('post-detail', args=[self.post.id])
+        self.client.get(url)
+        Like.objects.create(user=self.reader, post=self.post)
+        self.reader.following.add(self.author)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        data = self.client.get(url).data
+        self.assertEqual((data['like_count'], data['author']['follower_count']), (1, 1))
+
+
+class PostSearchTests(APITestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='searcher', password='pass')
+        self.title_match = Post.objects.create(author=self.user, title='Django tips', content='general notes')
+        self.body_match = Post.objects.create(author=self.user, title='Weekly notes', content='some django here')
+        Post.objects.create(author=self.user, title='Unrelated', content='nothing to see')
+
+    def search(self, term, **params):
+        return self.client.get(reverse('post-list'), {'search': term, **params})
+
+    def test_results_are_ranked(self):
+        response = self.search('django')
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [self.title_match.id, self.body_match.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        Post.objects.filter(pk=self.body_match.pk).update(content='rewritten')
+        self.title_match.delete()
+        self.assertEqual(self.search('django').data['results'], [])
+
+    def test_search_syntax_is_treated_literally(self):
+        response = self.search('"django" OR')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ranked_results_are_keyset_paginated(self):
+        first = self.search('django', page_size=1)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(first.data['results'][0]['id'], self.title_match.id)
+        self.assertEqual(second.data['results'][0]['id'], self.body_match.id)
+        self.assertIsNone(second.data['next'])
+
+
+class LikeStateTests(APITestCase):
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='body')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.reader)
+        self.bulk_url = reverse('post-bulk-like')
+
+    def like_state(self):
+        response = self.client.get(reverse('post-list'))
+        return {post['id']: (post['liked_by_me'], post['like_count']) for post in response.data['results']}
+
+    def test_list_reports_like_state_in_one_query(self):
+        Like.objects.create(user=self.reader, post=self.posts[0])
+        with self.assertNumQueries(1):
+            self.client.get(reverse('post-list'))
+        self.assertTrue(self.like_state()[self.posts[0].id][0])
+        self.assertFalse(self.like_state()[self.posts[1].id][0])
+
+    def test_bulk_like_and_unlike(self):
+        ids = [post.id for post in self.posts[:2]]
+        response = self.client.post(self.bulk_url, {'post_ids': ids + [999]}, format='json')
+        self.assertEqual(response.data['liked'], ids)
+
+        repeat = self.client.post(self.bulk_url, {'post_ids': ids}, format='json')
+        self.assertEqual(repeat.data['liked'], [])
+
+        state = self.like_state()
+        self.assertEqual(state[ids[0]], (True, 1))
+        self.assertEqual(state[self.posts[2].id], (False, 0))
+        drain()
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+        response = self.client.delete(self.bulk_url, {'post_ids': ids}, format='json')
+        self.assertEqual(response.data['unliked'], ids)
+        self.assertEqual(self.like_state()[ids[0]], (False, 0))
+
+    def test_bulk_like_rejects_empty_list(self):
+        response = self.client.post(self.bulk_url, {'post_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PostCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        follow(self.reader, self.author)
+        self.post = Post.objects.create(author=self.author, title='Cached', content='body')
+        fan_out_post(self.post)
+        self.url = reverse('post-detail', args=[self.post.id])
+
+    def test_repeat_retrieve_skips_the_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Cached')
+
+    def test_edits_likes_and_deletes_invalidate(self):
+        self.client.force_authenticate(self.author)
+        self.client.get(self.url)
+        self.client.patch(self.url, {'title': 'Edited'})
+        self.assertEqual(self.client.get(self.url).data['title'], 'Edited')
+
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        response = self.client.get(self.url)
+        self.assertEqual((response.data['like_count'], response.data['liked_by_me']), (1, True))
+
+        self.client.force_authenticate(self.author)
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_author_changes_invalidate_their_posts(self):
+        self.client.get(self.url)
+        fan = CustomUser.objects.create_user(username='fan', password='pass')
+        follow(fan, self.author)
+        self.assertEqual(self.client.get(self.url).data['author']['follower_count'], 2)
+
+    def test_feed_page_reuses_cached_posts(self):
+        self.client.force_authenticate(self.reader)
+        feed_url = reverse('feed-list')
+        first = self.client.get(feed_url)
+        # fan-out-on-read authors, timeline keys and liked_by_me only
+        with self.assertNumQueries(3):
+            second = self.client.get(feed_url)
+        self.assertEqual(first.data['results'], second.data['results'])
+
+
+class TrendingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='body') for i in range(3)]
+        self.fans = [CustomUser.objects.create_user(username=f'fan{i}', password='pass') for i in range(3)]
+        self.url = reverse('post-trending')
+
+    def like(self, fan, post):
+        self.client.force_authenticate(fan)
+        self.client.post(f'/api/posts/{post.id}/like/')
+
+    def test_likes_and_comments_rank_posts(self):
+        for fan in self.fans:
+            self.like(fan, self.posts[1])
+        self.client.post(reverse('comment-list'), {'post': self.posts[2].id, 'content': 'Nice'})
+
+        self.client.get(self.url)  # warm the post cache
+        with self.assertNumQueries(2):  # ranking read + liked_by_me overlay
+            response = self.client.get(self.url)
+
+        self.assertEqual([p['title'] for p in response.data], ['Post 1', 'Post 2'])
+        self.assertEqual(TrendingPost.objects.get(post=self.posts[1]).score, 3.0)
+
+    def test_unlike_takes_score_back(self):
+        self.like(self.fans[0], self.posts[0])
+        self.client.delete(f'/api/posts/{self.posts[0].id}/unlike/')
+
+        self.assertEqual(TrendingPost.objects.get(post=self.posts[0]).score, 0)
+
+    def test_decay_halves_per_half_life_and_prunes_cold_posts(self):
+        TrendingPost.objects.create(post=self.posts[0], score=8.0)
+        TrendingPost.objects.create(post=self.posts[1], score=0.15)
+        now = timezone.now()
+        decay_and_prune(now)  # first run only starts the clock
+
+        decayed, pruned = decay_and_prune(now + timedelta(hours=6))
+
+        self.assertEqual((decayed, pruned), (2, 1))
+        self.assertAlmostEqual(TrendingPost.objects.get().score, 4.0)
+        self.assertIn('Decayed 1', self.run_command())
+
+    def run_command(self):
+        out = StringIO()
+        call_command('update_trending', stdout=out)
+        return out.getvalue()
+
+
+class CommentThreadTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        self.client.force_authenticate(self.author)
+
+    def reply(self, content, parent=None):
+        data = {'post': self.post.id, 'content': content}
+        if parent:
+            data['parent'] = parent
+        return self.client.post(reverse('comment-list'), data).data['id']
+
+    def build_thread(self):
+        #  a
+        #  ├─ a1
+        #  │  └─ a1x
+        #  └─ a2
+        #  b
+        ids = {'a': self.reply('a')}
+        ids['a1'] = self.reply('a1', ids['a'])
+        ids['b'] = self.reply('b')
+        ids['a2'] = self.reply('a2', ids['a'])
+        ids['a1x'] = self.reply('a1x', ids['a1'])
+        return ids
+
+    def test_thread_is_depth_first_in_one_query(self):
+        self.build_thread()
+        url = reverse('comment-thread')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'post': self.post.id})
+
+        rows = [(c['content'], c['depth'], c['reply_count']) for c in response.data['results']]
+        self.assertEqual(rows, [('a', 0, 2), ('a1', 1, 1), ('a1x', 2, 0), ('a2', 1, 0), ('b', 0, 0)])
+        self.assertEqual(len([q for q in queries if 'posts_comment' in q['sql']]), 1)
+
+    def test_max_depth_collapses_and_pages(self):
+        self.build_thread()
+        url = reverse('comment-thread')
+
+        first = self.client.get(url, {'post': self.post.id, 'max_depth': 0, 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+
+        self.assertEqual([c['content'] for c in first['results'] + second['results']], ['a', 'b'])
+        self.assertEqual(first['results'][0]['reply_count'], 2)  # tells the client there is more
+
+    def test_replies_returns_one_subtree(self):
+        ids = self.build_thread()
+
+        response = self.client.get(reverse('comment-replies', args=[ids['a1']]))
+
+        self.assertEqual([c['content'] for c in response.data['results']], ['a1', 'a1x'])
+
+    def test_deleting_a_comment_removes_its_replies_from_the_counts(self):
+        ids = self.build_thread()
+
+        self.client.delete(reverse('comment-detail', args=[ids['a1']]))
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(Comment.objects.get(pk=ids['a']).reply_count, 1)
+        self.assertFalse(Comment.objects.filter(pk=ids['a1x']).exists())
+
+    def test_reply_must_be_on_the_same_post(self):
+        other = Post.objects.create(author=self.author, title='Other', content='body')
+        parent = self.reply('a')
+
+        response = self.client.post(reverse('comment-list'),
+                                    {'post': other.id, 'content': 'x', 'parent': parent})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_subtree_range_does_not_leak_into_siblings(self):
+        # a segment ending in "z" is followed by one that carries: "...0z" < "...10"
+        comments = [Comment.objects.create(post=self.post, author=self.author, content=str(i)) for i in range(40)]
+        for comment in comments:
+            threads.attach(comment)
+        carry = next(c for c in comments if c.id % 36 == 35)
+        reply = Comment.objects.create(post=self.post, author=self.author, content='r', parent=carry)
+        threads.attach(reply)
+
+        self.assertEqual(set(threads.subtree(carry).values_list('id', flat=True)), {carry.id, reply.id})
+
+
+class BulkPostImportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        follow(self.reader, self.author)
+        self.client.force_authenticate(self.author)
+        self.url = reverse('post-bulk-create')
+
+    def test_ndjson_body_is_imported_and_fanned_out(self):
+        body = '\n'.join([
+            '{"title": "One", "content": "first"}',
+            'not json',
+            '{"title": "", "content": "no title"}',
+            '',
+            '{"title": "Two", "content": "second"}',
+        ])
+
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['invalid']), (2, 2))
+        self.assertEqual([e['line'] for e in response.data['errors']], [2, 3])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_json_list_and_query_count_per_batch(self):
+        posts = [{'title': f'Post {i}', 'content': 'body'} for i in range(30)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'posts': posts}, format='json')
+
+        self.assertEqual(response.data['created'], 30)
+        self.assertEqual(Post.objects.filter(author=self.author).count(), 30)
+        self.assertLess(len(queries), 15)
+
+    @override_settings(POST_IMPORT_MAX_LINES=2)
+    def test_ndjson_beyond_the_limit_is_reported_as_truncated(self):
+        body = '\n'.join('{"title": "T%d", "content": "c"}' % i for i in range(3))
+
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.data['created'], 2)
+        self.assertTrue(response.data['truncated'])
+
+    def test_import_posts_command(self):
+        path = tempfile.mktemp(suffix='.jsonl')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        with open(path, 'w') as source:
+            for i in range(5):
+                source.write(json.dumps({'author': 'author', 'title': f'T{i}', 'content': 'c'}) + '\n')
+            source.write(json.dumps({'author': 'nobody', 'title': 'X', 'content': 'c'}) + '\n')
+
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, '--batch-size', '2', stdout=out, stderr=err)
+
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertIn('Imported 5 posts', out.getvalue())
+        self.assertIn('posts/s', out.getvalue())
+        self.assertIn('line 6', err.getvalue())
+
+
+class ConditionalRequestTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        follow(self.reader, self.author)
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        fan_out_post(self.post)
+        self.client.force_authenticate(self.reader)
+        self.detail = reverse('post-detail', args=[self.post.id])
+
+    def test_unchanged_post_is_not_modified_without_serializing(self):
+        etag = self.client.get(self.detail)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)  # versions and author come from the cache
+
+    def test_like_changes_the_etag(self):
+        etag = self.client.get(self.detail)['ETag']
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['liked_by_me'])
+
+    def test_feed_and_list_pages(self):
+        for url in [reverse('feed-list'), reverse('post-list')]:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.force_authenticate(self.author)
+        self.client.patch(self.detail, {'content': 'new'})
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.get(reverse('feed-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_comment_list_changes_when_a_reply_arrives(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, content='a')
+        threads.attach(comment)
+        url = reverse('comment-list')
+        etag = self.client.get(url, {'post': self.post.id})['ETag']
+        self.assertEqual(self.client.get(url, {'post': self.post.id}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(url, {'post': self.post.id, 'parent': comment.id, 'content': 'b'})
+
+        self.assertEqual(self.client.get(url, {'post': self.post.id}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_match_on_comment_delete(self):
+        comment_id = self.client.post(reverse('comment-list'), {'post': self.post.id, 'content': 'a'}).data['id']
+        detail = reverse('comment-detail', args=[comment_id])
+        etag = self.client.get(detail)['ETag']
+        self.client.patch(detail, {'content': 'edited'})
+
+        self.assertEqual(self.client.delete(detail, HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(self.client.delete(detail, HTTP_IF_MATCH=self.client.get(detail)['ETag']).status_code, 204)
+
+
+class ConditionalWriteTests(APITransactionTestCase):
+    """Real commits, so the cache version bumps that run on commit are in play."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, title='Post', content='body')
+        self.client.force_authenticate(self.author)
+        self.detail = reverse('post-detail', args=[self.post.id])
+
+    def test_if_match_rejects_stale_writes(self):
+        etag = self.client.get(self.detail)['ETag']
+        first = self.client.patch(self.detail, {'content': 'first'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first['ETag'], self.client.get(self.detail)['ETag'])
+
+        second = self.client.patch(self.detail, {'content': 'second'}, HTTP_IF_MATCH=etag)
+        third = self.client.patch(self.detail, {'content': 'third'}, HTTP_IF_MATCH=first['ETag'])
+
+        self.assertEqual(second.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content, 'third')
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', password='pass')
+        self.reader = CustomUser.objects.create_user(username='reader', password='pass')
+        follow(self.reader, self.author)
+        self.post = Post.objects.create(author=self.author, title='Post', content='a long body')
+        fan_out_post(self.post)
+        self.client.force_authenticate(self.reader)
+
+    def test_fields_trim_the_output_and_the_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post-list'), {'fields': 'id,title'})
+
+        self.assertEqual(response.data['results'], [{'id': self.post.id, 'title': 'Post'}])
+        sql = queries[-1]['sql']
+        self.assertNotIn('accounts_customuser', sql)
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('posts_like', sql)
+
+    def test_author_is_an_id_unless_expanded(self):
+        url = reverse('post-list')
+
+        flat = self.client.get(url, {'fields': 'id,author'}).data['results'][0]
+        expanded = self.client.get(url, {'fields': 'id,author', 'expand': 'author'}).data['results'][0]
+
+        self.assertEqual(flat['author'], self.author.id)
+        self.assertEqual(expanded['author']['username'], 'author')
+
+    def test_cached_views_trim_without_polluting_the_cache(self):
+        detail = reverse('post-detail', args=[self.post.id])
+
+        sparse = self.client.get(detail, {'fields': 'id,title,liked_by_me'}).data
+        feed = self.client.get(reverse('feed-list'), {'fields': 'title,author'}).data['results']
+        full = self.client.get(detail).data
+
+        self.assertEqual(sparse, {'id': self.post.id, 'title': 'Post', 'liked_by_me': False})
+        self.assertEqual(feed, [{'title': 'Post', 'author': self.author.id}])
+        self.assertEqual(full['content'], 'a long body')
+        self.assertEqual(full['author']['username'], 'author')
+
+    def test_without_fields_nothing_changes(self):
+        response = self.client.get(reverse('post-list'))
+
+        self.assertEqual(set(response.data['results'][0]), {
+            'id', 'author', 'title', 'content', 'created_at', 'updated_at',
+            'like_count', 'comment_count', 'liked_by_me',
+        })
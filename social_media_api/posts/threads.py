@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db.models import F
+
+from .models import Comment
+
+# A comment's path is its ancestors' ids followed by its own, each written
+# as a fixed-width base-36 segment:
+#     "00000001"                   comment 1, top level
+#     "0000000100000005"           comment 5, a reply to 1
+#     "00000001000000050000000b"   comment 11, a reply to 5
+# Fixed width makes string order equal tree order (depth-first, siblings
+# oldest first), so (post, path) serves a whole thread as one index range.
+SEGMENT_WIDTH = 8
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def segment(comment_id):
+    digits = ""
+    while comment_id:
+        comment_id, remainder = divmod(comment_id, 36)
+        digits = DIGITS[remainder] + digits
+    return digits.rjust(SEGMENT_WIDTH, "0")
+
+
+def subtree_range(comment):
+    """
+    (low, high) such that low <= path < high holds for exactly the comment
+    and its descendants. The upper bound is the next sibling id's path
+    rather than a sentinel character, so it orders the same under any
+    collation.
+    """
+    return comment.path, comment.path[:-SEGMENT_WIDTH] + segment(comment.id + 1)
+
+
+def subtree(comment):
+    low, high = subtree_range(comment)
+    return Comment.objects.filter(post_id=comment.post_id, path__gte=low, path__lt=high)
+
+
+def attach(comment):
+    """
+    Give a freshly inserted comment its path and depth, and count it as a
+    reply of its parent. Call in the transaction that created it.
+    """
+    parent = comment.parent
+    comment.path = (parent.path if parent else "") + segment(comment.id)
+    comment.depth = parent.depth + 1 if parent else 0
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path, depth=comment.depth)
+    if parent:
+        Comment.objects.filter(pk=parent.pk).update(reply_count=F("reply_count") + 1)
+
+
+def can_reply_to(parent):
+    return parent.depth + 1 < settings.COMMENT_MAX_DEPTH
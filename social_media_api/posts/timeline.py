@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db.models import F, FilteredRelation, Q, Window
+from django.db.models.functions import RowNumber
+
+from accounts import graph
+from accounts.models import CustomUser
+from .models import Post, TimelineEntry
+
+
+def fan_out_on_read_author_ids(user):
+    """Accounts this user follows that are too popular to fan out on write."""
+    return list(
+        user.following.filter(follower_count__gt=settings.FEED_FANOUT_FOLLOWER_LIMIT)
+        .values_list("id", flat=True)
+    )
+
+
+def fan_out_post(post):
+    """
+    Copy a new post into the timeline of every follower of its author.
+    Authors above FEED_FANOUT_FOLLOWER_LIMIT are skipped; their posts
+    are merged into the feed at read time instead.
+    """
+    # Read the counter fresh; the author instance may come from an auth cache
+    follower_count = CustomUser.objects.values_list("follower_count", flat=True).get(pk=post.author_id)
+    if follower_count > settings.FEED_FANOUT_FOLLOWER_LIMIT:
+        return 0
+    entries = [
+        TimelineEntry(user_id=follower_id, post=post, created_at=post.created_at)
+        for follower_id in graph.follower_ids(post.author_id)
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def fan_out_posts(posts):
+    """
+    fan_out_post() for a batch of saved posts: one follower-count query and
+    one bulk insert for the whole batch. Posts without a pk (backends that
+    cannot return ids from bulk_create) are skipped; run backfill_timelines.
+    """
+    author_ids = {post.author_id for post in posts if post.pk is not None}
+    fanned_out = set(
+        CustomUser.objects.filter(
+            id__in=author_ids, follower_count__lte=settings.FEED_FANOUT_FOLLOWER_LIMIT
+        ).values_list("id", flat=True)
+    )
+    entries = [
+        TimelineEntry(user_id=follower_id, post=post, created_at=post.created_at)
+        for post in posts
+        if post.author_id in fanned_out
+        for follower_id in graph.follower_ids(post.author_id)
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def backfill_timeline(user, author_ids):
+    """
+    Copy the most recent posts of newly followed authors into a timeline.
+    High-fan-out authors are left to the read side.
+    """
+    recent_posts = (
+        Post.objects.filter(
+            author_id__in=author_ids,
+            author__follower_count__lte=settings.FEED_FANOUT_FOLLOWER_LIMIT,
+        )
+        .annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(recency__lte=settings.FEED_BACKFILL_POSTS)
+        .values_list("id", "created_at")
+    )
+    entries = [
+        TimelineEntry(user=user, post_id=post_id, created_at=created_at)
+        for post_id, created_at in recent_posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.FEED_FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def remove_from_timeline(user, author_ids):
+    """Drop an unfollowed author's posts from a timeline."""
+    return TimelineEntry.objects.filter(user=user, post__author_id__in=author_ids).delete()[0]
+
+
+def feed_sources(user):
+    """
+    A user's feed as (created_at, post_id) rows from separate keyset
+    sources, for MergedKeysetPagination: the materialized timeline (a range
+    on timeline_user_created_idx, posts_post is not read) and the posts of
+    each followed high-fan-out author (a range on post_author_created_idx).
+    """
+    sources = [
+        TimelineEntry.objects.filter(user=user).values_list("created_at", "post_id", named=True)
+    ]
+    for author_id in fan_out_on_read_author_ids(user):
+        sources.append(
+            Post.objects.filter(author_id=author_id)
+            .annotate(post_id=F("id"))
+            .values_list("created_at", "post_id", named=True)
+        )
+    return sources
+
+
+def feed_queryset(user):
+    """
+    Posts for a user's feed as one queryset: their materialized timeline,
+    plus the posts of any followed high-fan-out authors, newest first.
+    Fine for looking up a single post; pages are read with feed_sources().
+    """
+    queryset = Post.objects.annotate(
+        timeline_entry=FilteredRelation(
+            "timeline_entries", condition=Q(timeline_entries__user=user)
+        )
+    )
+    in_feed = Q(timeline_entry__isnull=False)
+    pulled_author_ids = fan_out_on_read_author_ids(user)
+    if pulled_author_ids:
+        in_feed |= Q(author_id__in=pulled_author_ids)
+    return queryset.filter(in_feed).order_by("-created_at", "-id")
+
+
+def rebuild_timeline(user):
+    """Recreate a user's timeline from scratch (used by backfill_timelines)."""
+    TimelineEntry.objects.filter(user=user).delete()
+    return backfill_timeline(user, list(graph.following_ids(user.id)))
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import TrendingPost
+
+# Each like or comment adds its weight to the post's TrendingPost.score, so
+# ranking never counts Like/Comment rows. update_trending multiplies every
+# score by 2 ** (-hours since its last run / TRENDING_HALF_LIFE_HOURS) in one
+# UPDATE and deletes the rows that fell below TRENDING_MIN_SCORE, which keeps
+# the table down to recently active posts. Rows created since the last run
+# are decayed as if they were that old, an error of at most one run interval.
+
+
+def bump(post_ids, weight):
+    """Add weight to the trending score of each post (one INSERT, one UPDATE)."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    if weight > 0:
+        TrendingPost.objects.bulk_create(
+            [TrendingPost(post_id=post_id) for post_id in post_ids], ignore_conflicts=True
+        )
+    TrendingPost.objects.filter(post_id__in=post_ids).update(score=F("score") + weight)
+
+
+def record_likes(post_ids):
+    bump(post_ids, settings.TRENDING_LIKE_WEIGHT)
+
+
+def record_unlikes(post_ids):
+    bump(post_ids, -settings.TRENDING_LIKE_WEIGHT)
+
+
+def record_comment(post_id):
+    bump([post_id], settings.TRENDING_COMMENT_WEIGHT)
+
+
+def record_uncomment(post_id, count=1):
+    bump([post_id], -settings.TRENDING_COMMENT_WEIGHT * count)
+
+
+def decay_and_prune(now=None):
+    """Apply the decay accrued since the last run; returns (decayed, pruned) row counts."""
+    now = now or timezone.now()
+    last_run = TrendingPost.objects.aggregate(last=Max("decayed_at"))["last"]
+    decayed = 0
+    if last_run is not None:
+        hours = (now - last_run).total_seconds() / 3600
+        factor = 0.5 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+        decayed = TrendingPost.objects.update(score=F("score") * factor, decayed_at=now)
+    else:
+        TrendingPost.objects.update(decayed_at=now)  # first run: start the clock
+    pruned, _ = TrendingPost.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+    return decayed, pruned
+
+
+def top_posts(limit):
+    """(post_id, author_id) of the highest-scoring posts: one read of trending_score_idx."""
+    return list(
+        TrendingPost.objects.order_by("-score", "-post_id")
+        .values_list("post_id", "post__author_id")[:limit]
+    )
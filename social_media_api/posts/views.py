@@ -3,16 +3,34 @@ from rest_framework.response import Response
 from rest_framework.decorators import action    
 from rest_framework.exceptions import PermissionDenied
 from .models import Post, Comment
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import PostSerializer, CommentSerializer, PostIdsSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.shortcuts import get_object_or_404
 from accounts.models import CustomUser
 from accounts.serializers import UserSerializer
 from rest_framework.authtoken.models import Token
-from notifications.models import Notification
+from notifications.models import NotificationOutbox
+from notifications.outbox import enqueue, enqueue_many
 from .models import Like
 from rest_framework import status
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.contrib.contenttypes.models import ContentType
+from .timeline import fan_out_post, feed_queryset, feed_sources
+from .search import PostSearchFilter
+from . import cache as post_cache
+from . import trending as post_trending
+from . import threads as post_threads
+from .ingest import ImportStats, import_posts, read_json_lines
+from django.conf import settings
+import itertools
+from rest_framework.exceptions import ValidationError
+from django.http import Http404
+from social_media_api.pagination import KeysetPagination, MergedKeysetPagination
+from social_media_api.conditional import ConditionalMixin, make_etag
+from social_media_api.fieldsets import narrow_queryset, trim, wants
 
 # ----- Custom Permission -----
 class IsAuthorOrReadOnly(permissions.BasePermission):
@@ -28,28 +46,194 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         return obj.author == request.user
 
 
+# ----- Cached post rendering -----
+class CachedPostMixin(ConditionalMixin):
+    """
+    Serve serialized posts through the versioned cache in posts/cache.py.
+    Only liked_by_me is per-user; it is overlaid with one query per page.
+    """
+
+    def posts_etag(self, rows, *extra):
+        """
+        ETag for posts from their cache versions alone. Anything that
+        changes a post, its author or its likes bumps a version.
+        """
+        versions = post_cache.get_row_versions(rows)
+        params = self.request.query_params
+        return make_etag(self.request.user.pk, versions, params.get("fields"), params.get("expand"), *extra)
+
+    def build_post_payloads(self, post_ids):
+        posts = Post.objects.select_related("author").filter(id__in=post_ids)
+        payloads = {}
+        # Cached payloads are always complete; ?fields= is applied on the way out
+        for data in self.get_serializer(posts, many=True, sparse=False).data:
+            data.pop("liked_by_me", None)
+            payloads[data["id"]] = data
+        return payloads
+
+    def render_posts(self, rows):
+        """rows: (post_id, author_id) pairs in display order."""
+        payloads = post_cache.get_post_payloads(rows, self.build_post_payloads)
+        user = self.request.user
+        liked = set()
+        if user.is_authenticated and payloads and wants(self.request, "liked_by_me"):
+            liked = set(
+                Like.objects.filter(user=user, post_id__in=payloads).values_list("post_id", flat=True)
+            )
+        return [
+            trim({**payloads[post_id], "liked_by_me": post_id in liked}, self.request, ["author"])
+            for post_id, _ in rows
+            if post_id in payloads
+        ]
+
+
 # ----- POST VIEWSET -----
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by("-created_at")
+class PostViewSet(CachedPostMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.order_by("-created_at")  # author joined in get_queryset
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = KeysetPagination  # ?cursor=... keyed on (created_at, id)
     
     # Add filtering + searching + ordering
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, PostSearchFilter, filters.OrderingFilter]
     filterset_fields = ["author"]   # allow ?author=1
-    search_fields = ["title", "content"]  # allow ?search=hello
+    search_fields = ["title", "content"]  # allow ?search=hello (ranked full-text, see search.py)
     ordering_fields = ["created_at", "updated_at"]  # allow ?ordering=created_at
 
+    def get_queryset(self):
+        # ?fields=/?expand= decide the columns and whether author is joined
+        queryset = narrow_queryset(
+            super().get_queryset(), self.request, expandable=["author"],
+            always=["id", "author", "created_at", "updated_at"],  # ETag, cursor and ordering keys
+        )
+        if wants(self.request, "liked_by_me"):
+            queryset = queryset.with_like_state(self.request.user)
+        if self.request.method not in permissions.SAFE_METHODS and "HTTP_IF_MATCH" in self.request.META:
+            # Hold the row until the write commits so the If-Match check can't race
+            queryset = queryset.select_for_update(of=("self",))
+        return queryset
+
+    def get_object(self):
+        post = super().get_object()
+        if self.request.method not in permissions.SAFE_METHODS:
+            self.check_if_match(self.posts_etag([(post.pk, post.author_id)]))
+        return post
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        etag = self.posts_etag([(post.id, post.author_id) for post in page], *self.page_etag_parts())
+        return self.conditional_response(
+            etag, lambda: self.get_paginated_response(self.get_serializer(page, many=True).data)
+        )
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().update(request, *args, **kwargs)
+        # After the commit, so the ETag sees the version bump() writes on commit
+        response["ETag"] = self.posts_etag([(response.data["id"], response.data["author"]["id"])])
+        return response
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         # Automatically set the logged-in user as the author
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Push the new post into followers' timelines
+        fan_out_post(post)
+
+    def perform_update(self, serializer):
+        post = serializer.save()
+        post_cache.bump_post(post.pk)
+
+    def perform_destroy(self, instance):
+        post_id = instance.pk
+        instance.delete()
+        post_cache.bump_post(post_id)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Served from the cache; the database is only read on a miss
+        try:
+            post_id = int(kwargs[self.lookup_field])
+            author_id = post_cache.author_of(
+                post_id, lambda pk: Post.objects.values_list("author_id", flat=True).get(pk=pk)
+            )
+        except (ValueError, Post.DoesNotExist):
+            raise Http404
+
+        def render():
+            results = self.render_posts([(post_id, author_id)])
+            if not results:
+                raise Http404
+            return Response(results[0])
+        # Deleting a post bumps its version, so a stale ETag never hides a 404
+        return self.conditional_response(self.posts_etag([(post_id, author_id)]), render)
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        """Top posts by time-decayed likes and comments (?limit=, max 100)"""
+        try:
+            limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        rows = post_trending.top_posts(limit)
+        return self.conditional_response(self.posts_etag(rows), lambda: Response(self.render_posts(rows)))
+
+    @action(detail=False, methods=["post"], url_path="bulk",
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk_create(self, request):
+        """
+        Create many posts as the current user. Send NDJSON (one post per
+        line, Content-Type: application/x-ndjson), read as it streams in,
+        or JSON {"posts": [...]}. At most POST_IMPORT_MAX_LINES per request.
+        """
+        limit = settings.POST_IMPORT_MAX_LINES
+        lines = None
+        if request.content_type.startswith("application/x-ndjson"):
+            lines = iter(request._request)  # the request body, read line by line as it streams in
+            records = read_json_lines(itertools.islice(lines, limit))
+        else:
+            posts = request.data.get("posts") if hasattr(request.data, "get") else None
+            if not isinstance(posts, list):
+                raise ValidationError({"posts": "Expected a list of posts."})
+            if len(posts) > limit:
+                raise ValidationError({"posts": f"At most {limit} posts per request."})
+            records = ((n, r if isinstance(r, dict) else None) for n, r in enumerate(posts, start=1))
+
+        stats = ImportStats()
+        for _ in import_posts(records, author=request.user, stats=stats):
+            pass
+        return Response({
+            "created": stats.created,
+            "invalid": stats.invalid,
+            "errors": stats.errors,
+            "truncated": lines is not None and next(lines, None) is not None,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post", "delete"], url_path="bulk-like",
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk_like(self, request):
+        """Like (POST) or unlike (DELETE) up to 100 posts in one request"""
+        serializer = PostIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        post_ids = set(serializer.validated_data["post_ids"])
+
+        if request.method == "DELETE":
+            unliked = unlike_posts(request.user, post_ids)
+            post_cache.bump_posts(unliked)
+            return Response({"unliked": unliked})
+        liked = like_posts(request.user, post_ids)
+        post_cache.bump_posts(liked)
+        return Response({"liked": liked})
 
 
 # ----- COMMENT VIEWSET -----
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by("-created_at")
+class CommentViewSet(ConditionalMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related("author").order_by("-created_at")
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = KeysetPagination
 
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ["post", "author"]  # allow ?post=1
@@ -61,48 +245,221 @@ class CommentViewSet(viewsets.ModelViewSet):
         if comment.post.author == user:
             return
 
-        Notification.objects.create(
+        enqueue(
             recipient=comment.post.author,   # post owner
             actor=user,                      # the commenter
             verb="commented on your post",
-            target=comment                   # GenericForeignKey handles this
+            target=comment
         )
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS and "HTTP_IF_MATCH" in self.request.META:
+            queryset = queryset.select_for_update(of=("self",))
+        return queryset
+
+    def get_object(self):
+        comment = super().get_object()
+        if self.request.method not in permissions.SAFE_METHODS:
+            self.check_if_match(self.comments_etag([comment]))
+        return comment
+
+    def comments_etag(self, comments, *extra):
+        """
+        ETag from each comment's updated_at and reply count, plus its
+        author's cache version (the nested author summary).
+        """
+        authors = post_cache.get_versions(
+            sorted({post_cache.AUTHOR_VERSION_KEY.format(c.author_id) for c in comments})
+        )
+        rows = [(c.id, c.updated_at, c.reply_count) for c in comments]
+        return make_etag(rows, sorted(authors.items()), *extra)
+
+    def page_response(self, page):
+        return self.conditional_response(
+            self.comments_etag(page, *self.page_etag_parts()),
+            lambda: self.get_paginated_response(self.get_serializer(page, many=True).data),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.page_response(self.paginate_queryset(self.filter_queryset(self.get_queryset())))
+
+    def retrieve(self, request, *args, **kwargs):
+        comment = self.get_object()
+        return self.conditional_response(
+            self.comments_etag([comment]), lambda: Response(self.get_serializer(comment).data)
+        )
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response["ETag"] = self.comments_etag([Comment.objects.get(pk=response.data["id"])])
+        return response
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        comment = serializer.save(author=self.request.user)
-        self.create_comment_notification(self.request.user, comment)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            post_threads.attach(comment)
+            Post.objects.filter(pk=comment.post_id).update(comment_count=F("comment_count") + 1)
+            post_trending.record_comment(comment.post_id)
+            self.create_comment_notification(self.request.user, comment)
+        post_cache.bump_post(comment.post_id)
+
+    def perform_destroy(self, instance):
+        # Deleting a comment deletes its replies too; count them all
+        with transaction.atomic():
+            subtree = post_threads.subtree(instance)
+            removed = subtree.count()
+            subtree.delete()
+            Post.objects.filter(pk=instance.post_id).update(
+                comment_count=Greatest(F("comment_count") - removed, Value(0))
+            )
+            if instance.parent_id:
+                Comment.objects.filter(pk=instance.parent_id).update(
+                    reply_count=Greatest(F("reply_count") - 1, Value(0))
+                )
+            post_trending.record_uncomment(instance.post_id, removed)
+        post_cache.bump_post(instance.post_id)
+
+    def thread_page(self, comments, max_depth):
+        """One keyset page of comments in tree order, down to max_depth."""
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=max_depth)
+        return self.page_response(self.paginate_queryset(comments.order_by("path")))
+
+    def get_max_depth(self, base=0):
+        value = self.request.query_params.get("max_depth")
+        if value is None:
+            return None
+        try:
+            return base + max(int(value), 0)
+        except ValueError:
+            raise ValidationError({"max_depth": "Must be an integer."})
+
+    @action(detail=False, methods=["get"])
+    def thread(self, request):
+        """A post's comments as a tree, depth-first (?post= required, ?max_depth= collapses replies)"""
+        try:
+            post_id = int(request.query_params["post"])
+        except (KeyError, ValueError):
+            raise ValidationError({"post": "A post id is required."})
+        comments = Comment.objects.select_related("author").filter(post_id=post_id)
+        return self.thread_page(comments, self.get_max_depth())
 
-class FeedViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=True, methods=["get"])
+    def replies(self, request, pk=None):
+        """A comment followed by its replies, depth-first (?max_depth= counts from this comment)"""
+        comment = self.get_object()
+        comments = post_threads.subtree(comment).select_related("author")
+        return self.thread_page(comments, self.get_max_depth(base=comment.depth))
+
+class FeedPagination(MergedKeysetPagination):
+    """Keyset pages over feed_sources(): (created_at, post_id) rows."""
+    tiebreaker = "post_id"
+
+
+class FeedViewSet(CachedPostMixin, viewsets.ReadOnlyModelViewSet):
     """
     Viewset for the user's feed, showing posts from followed users.
     """
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    ordering_fields = ["created_at"]  # the only key every feed source has
+    pagination_class = FeedPagination
 
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             raise PermissionDenied("You must be logged in to view the feed.")
-        # Get posts from users this user is following
-        following_users = user.following.all()
-        return Post.objects.filter(author__in=following_users).order_by("-created_at")
+        # Read the user's materialized timeline (see posts/timeline.py)
+        return feed_queryset(user).select_related("author").with_like_state(user)
+
+    def list(self, request, *args, **kwargs):
+        # Page through timeline keys only; post bodies come from the cache
+        # and are serialized only on a miss.
+        page = self.paginate_queryset(
+            [self.filter_queryset(source) for source in feed_sources(request.user)]
+        )
+        post_ids = [row.post_id for row in page]
+        authors = post_cache.authors_of(
+            post_ids,
+            lambda missing: dict(Post.objects.filter(id__in=missing).values_list("id", "author_id")),
+        )
+        rows = [(post_id, authors[post_id]) for post_id in post_ids if post_id in authors]
+        return self.conditional_response(
+            self.posts_etag(rows, *self.page_etag_parts()),
+            lambda: self.get_paginated_response(self.render_posts(rows)),
+        )
+
+def like_posts(user, post_ids):
+    """Like many posts at once; returns the ids that were newly liked."""
+    already_liked = set(
+        Like.objects.filter(user=user, post_id__in=post_ids).values_list("post_id", flat=True)
+    )
+    to_like = list(
+        Post.objects.filter(id__in=post_ids - already_liked).values_list("id", "author_id")
+    )
+    liked_ids = [post_id for post_id, _ in to_like]
+    with transaction.atomic():
+        Like.objects.bulk_create(
+            [Like(user=user, post_id=post_id) for post_id in liked_ids],
+            ignore_conflicts=True,  # a concurrent single like wins; reconcile_counters fixes counts
+        )
+        Post.objects.filter(id__in=liked_ids).update(like_count=F("like_count") + 1)
+        post_trending.record_likes(liked_ids)
+
+        post_type = ContentType.objects.get_for_model(Post)
+        enqueue_many([
+            NotificationOutbox(
+                recipient_id=author_id,
+                actor=user,
+                verb="liked your post",
+                target_content_type=post_type,
+                target_object_id=post_id,
+            )
+            for post_id, author_id in to_like
+            if author_id != user.id
+        ])
+    return sorted(liked_ids)
+
+
+def unlike_posts(user, post_ids):
+    """Remove the user's likes on many posts; returns the ids that were unliked."""
+    with transaction.atomic():
+        likes = Like.objects.select_for_update().filter(user=user, post_id__in=post_ids)
+        unliked_ids = list(likes.values_list("post_id", flat=True))
+        Like.objects.filter(user=user, post_id__in=unliked_ids).delete()
+        # Greatest() keeps counters from going negative if they have drifted
+        Post.objects.filter(id__in=unliked_ids).update(like_count=Greatest(F("like_count") - 1, Value(0)))
+        post_trending.record_unlikes(unliked_ids)
+    return sorted(unliked_ids)
+
 
 class LikePostView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request, pk):
         post = generics.get_object_or_404(Post, pk=pk)
 
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                Post.objects.filter(pk=post.pk).update(like_count=F("like_count") + 1)
+                post_trending.record_likes([post.pk])
+                # queue a notification for the post owner
+                if post.author != request.user:
+                    enqueue(
+                        recipient=post.author,
+                        actor=request.user,
+                        verb="liked your post",
+                        target=post
+                    )
         if created:
-            # create notification for the post owner
-            if post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=request.user,
-                    verb="liked your post",
-                    target=post
-                )
+            post_cache.bump_post(post.pk)
             return Response({"detail": "Post liked."}, status=status.HTTP_201_CREATED)
         else:
             return Response({"detail": "You already liked this post."}, status=status.HTTP_200_OK)
@@ -114,8 +471,12 @@ class UnlikePostView(generics.GenericAPIView):
     def delete(self, request, pk):
         post = generics.get_object_or_404(Post, pk=pk)
 
-        like = Like.objects.filter(user=request.user, post=post).first()
-        if like:
-            like.delete()
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
+            if deleted:
+                Post.objects.filter(pk=post.pk).update(like_count=Greatest(F("like_count") - 1, Value(0)))
+                post_trending.record_unlikes([post.pk])
+        if deleted:
+            post_cache.bump_post(post.pk)
             return Response({"detail": "Post unliked."}, status=status.HTTP_200_OK)
         return Response({"detail": "You have not liked this post."}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
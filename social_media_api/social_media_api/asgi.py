@@ -3,6 +3,11 @@ ASGI config for social_media_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The notification stream (/api/notifications/stream/) holds one open
+connection per client, so the app is served from here with an ASGI server
+(see the Procfile: ``gunicorn social_media_api.asgi -k uvicorn_worker.UvicornWorker``).
+Under WSGI the stream answers 501.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,65 @@
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource has changed since you fetched it."
+    default_code = "precondition_failed"
+
+
+def make_etag(*parts):
+    """ETag over anything with a stable repr (ids, versions, timestamps)."""
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def etag_matches(header, etag, weak=True):
+    """
+    If-None-Match compares weakly (W/"x" matches "x"); If-Match
+    compares strongly, so a weak tag never matches there.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = parse_etags(header)
+    if weak:
+        return any(tag.removeprefix("W/") == etag for tag in tags)
+    return etag in tags
+
+
+class ConditionalMixin:
+    """
+    ETag support for viewsets. Views compute an ETag from data they already
+    have in hand (cache versions, the page's keys, updated_at) and only
+    serialize when the client's copy is stale:
+
+        return self.conditional_response(etag, lambda: Response(...))
+
+    Writes that carry If-Match call check_if_match() with the ETag of the
+    row they are about to change, and get 412 if someone changed it first.
+    """
+
+    def conditional_response(self, etag, render):
+        if etag_matches(self.request.META.get("HTTP_IF_NONE_MATCH"), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = render()
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Authorization"])  # bodies differ per user
+        return response
+
+    def check_if_match(self, etag):
+        header = self.request.META.get("HTTP_IF_MATCH")
+        if header and not etag_matches(header, etag, weak=False):
+            raise PreconditionFailed()
+
+    def page_etag_parts(self):
+        """What else a paginated response carries besides its rows."""
+        paginator = self.paginator
+        return paginator.get_next_link(), paginator.get_previous_link(), getattr(paginator, "count", None)
@@ -0,0 +1,93 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+# Sparse fieldsets: ?fields=id,title returns only those fields, and a nested
+# relation listed in `expandable_fields` comes back as its id unless it is
+# also named in ?expand= (e.g. ?fields=id,title,author&expand=author).
+# Without ?fields= responses are unchanged. narrow_queryset() applies the
+# same choice to the SQL: only the requested columns, and no join for an
+# unexpanded relation.
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _param_set(request, name):
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(",") if part.strip()}
+
+
+def requested_fields(request):
+    """The ?fields= names, or None when the client wants everything."""
+    return _param_set(request, FIELDS_PARAM)
+
+
+def requested_expansions(request):
+    return _param_set(request, EXPAND_PARAM) or set()
+
+
+def wants(request, name):
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+
+def trim(data, request, expandable=()):
+    """Apply ?fields=/?expand= to an already serialized dict (e.g. from a cache)."""
+    fields = requested_fields(request)
+    if fields is None:
+        return data
+    expand = requested_expansions(request)
+    trimmed = {name: value for name, value in data.items() if name in fields}
+    for name in expandable:
+        if name in trimmed and name not in expand and isinstance(trimmed[name], dict):
+            trimmed[name] = trimmed[name]["id"]
+    return trimmed
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for ?fields=/?expand= on reads. Pass sparse=False to
+    always get the full representation (e.g. for values that get cached).
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, sparse=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        fields = requested_fields(request) if sparse else None
+        if fields is None:
+            return
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+        expand = requested_expansions(request)
+        for name in self.expandable_fields:
+            if name in self.fields and name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+def narrow_queryset(queryset, request, expandable=(), always=("id",)):
+    """
+    Restrict a queryset to the columns behind ?fields=, joining an
+    expandable relation only when it is expanded. `always` names columns
+    the view needs regardless (ids, pagination keys).
+    """
+    fields = requested_fields(request)
+    if fields is None:
+        return queryset.select_related(*expandable) if expandable else queryset
+    expand = requested_expansions(request)
+    columns = set(always)
+    for name in fields:
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue  # a computed serializer field, e.g. liked_by_me
+        if field.concrete and not field.many_to_many:
+            columns.add(name)
+    joined = [name for name in expandable if name in fields and name in expand]
+    if joined:  # select_related() with no arguments would follow every foreign key
+        queryset = queryset.select_related(*joined)
+    return queryset.only(*columns)
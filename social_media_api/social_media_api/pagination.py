@@ -0,0 +1,248 @@
+import base64
+import binascii
+import datetime
+import heapq
+import itertools
+import json
+import operator
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(queryset):
+    """
+    Row estimate for a queryset. PostgreSQL answers from the planner
+    without scanning; other backends fall back to an exact COUNT(*).
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination keyed on (ordering field, id).
+
+    The key is the first term of the queryset's ordering (or the model's
+    Meta.ordering, or `ordering` below), with `id` as the tie-breaker, so
+    every page is a bounded range read on a composite index no matter how
+    deep it is. Clients can ask for `?count=approx` to get an estimated
+    total; no COUNT(*) is run otherwise.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering = "-created_at"
+    tiebreaker = "id"
+    invalid_cursor_message = "Invalid cursor"
+    invalid_key_message = "Cannot page on '{}'; order by a column instead."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_key(queryset)
+        self.has_next = self.has_previous = False
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "approx":
+            self.count = self.get_count(queryset)
+
+        cursor = self.decode_cursor(request)
+        if cursor:
+            cursor = self.clean_cursor(queryset, cursor)
+        reverse = bool(cursor and cursor.get("r"))
+        descending = self.descending != reverse  # walk backwards for "previous"
+
+        results = self.fetch(queryset, cursor, descending)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def fetch(self, queryset, cursor, descending):
+        """Up to page_size + 1 rows after the cursor, in key order."""
+        queryset = queryset.order_by(*self.order_terms(descending))
+        if cursor:
+            queryset = queryset.filter(self.after(cursor["v"], cursor["id"], descending))
+        return list(queryset[:self.page_size + 1])
+
+    def get_count(self, queryset):
+        return approximate_count(queryset)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_key(self, queryset):
+        ordering = (
+            queryset.query.order_by
+            or queryset.model._meta.ordering
+            or (self.ordering,)
+        )
+        term = ordering[0]
+        if not isinstance(term, str):
+            term = self.ordering
+        field = term.lstrip("-")
+        if not self.is_column(queryset, field):
+            raise ValidationError({"ordering": [self.invalid_key_message.format(field)]})
+        return field, term.startswith("-")
+
+    def key_field(self, queryset):
+        if self.field in queryset.query.annotations:
+            return queryset.query.annotations[self.field].output_field
+        if self.field == "pk":
+            return queryset.model._meta.pk
+        return queryset.model._meta.get_field(self.field)
+
+    def clean_cursor(self, queryset, cursor):
+        """Convert the cursor's values to the key's types; anything else is an invalid cursor."""
+        try:
+            value = self.key_field(queryset).to_python(cursor["v"])
+            if value is None:
+                raise ValueError("null cursor value")
+            return {**cursor, "v": value, "id": int(cursor["id"])}
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def is_column(self, queryset, name):
+        """Whether `name` is a scalar value the cursor can carry: a concrete non-relation field or an annotation."""
+        if name == "pk" or name in queryset.query.annotations:
+            return True
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        return field.concrete and not field.is_relation
+
+    def order_terms(self, descending):
+        prefix = "-" if descending else ""
+        if self.field in (self.tiebreaker, "pk"):
+            return [prefix + self.tiebreaker]
+        return [prefix + self.field, prefix + self.tiebreaker]
+
+    def after(self, value, tiebreak, descending):
+        op = "lt" if descending else "gt"
+        if self.field in (self.tiebreaker, "pk"):
+            return Q(**{f"{self.tiebreaker}__{op}": tiebreak})
+        return Q(**{f"{self.field}__{op}": value}) | Q(
+            **{self.field: value, f"{self.tiebreaker}__{op}": tiebreak}
+        )
+
+    # ----- Cursor encoding -----
+    def encode_cursor(self, obj, reverse=False):
+        value = getattr(obj, self.field)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = value.isoformat()  # keeps microseconds, unlike DjangoJSONEncoder
+        data = {"v": value, "id": getattr(obj, self.tiebreaker)}
+        if reverse:
+            data["r"] = 1
+        token = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode())
+        return token.decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(data, dict) or "v" not in data or "id" not in data:
+                raise ValueError
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return data
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[0], reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.count is not None:
+            payload = {"count": self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "description": "Present with ?count=approx"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class MergedKeysetPagination(KeysetPagination):
+    """
+    KeysetPagination over a list of querysets that share the key columns.
+
+    Each queryset is read as its own bounded range (page_size + 1 rows
+    after the cursor) and the results are merged, so a page never costs
+    more than one index range read per source. Rows with the same key in
+    several sources are returned once. The key is taken from the first
+    queryset's ordering.
+    """
+
+    def get_key(self, querysets):
+        return super().get_key(querysets[0])
+
+    def key_field(self, querysets):
+        return super().key_field(querysets[0])
+
+    def get_count(self, querysets):
+        return sum(approximate_count(queryset) for queryset in querysets)
+
+    def fetch(self, querysets, cursor, descending):
+        key = operator.attrgetter(self.field, self.tiebreaker)
+        ranges = [super(MergedKeysetPagination, self).fetch(queryset, cursor, descending) for queryset in querysets]
+        merged = heapq.merge(*ranges, key=key, reverse=descending)
+        unique = (next(rows) for _, rows in itertools.groupby(merged, key=key))
+        return list(itertools.islice(unique, self.page_size + 1))
@@ -33,6 +33,8 @@ STATICFILES_DIRS = [
 # Media files (user uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+PROFILE_PICTURE_SIZES = (64, 256)  # square variants rendered by process_profile_pictures
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per query while streaming a data export
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -116,6 +118,19 @@ DATABASES['default'] = dj_database_url.parse(database_url)
 
 
 
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production
+# so every worker sees the same versions.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "social-media-api"),
+    }
+}
+POST_CACHE_TIMEOUT = 60 * 60  # seconds a serialized post stays cached
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -163,7 +178,7 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,  # adjust as needed
@@ -172,8 +187,63 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ],
+    # Sliding-window limits for the password endpoints (see accounts/throttles.py)
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": "20/min",
+        "login_username": "5/min",
+        "register_ip": "10/hour",
+    },
 }
 
+# Token authentication cache (see accounts/authentication.py)
+AUTH_TOKEN_CACHE_SIZE = 10000  # tokens kept per process
+AUTH_TOKEN_CACHE_TTL = 60  # seconds; also how long another process may still accept a revoked token
+AUTH_TOKEN_SHARED_CACHE = os.getenv("AUTH_TOKEN_SHARED_CACHE", "False") == "True"
+AUTH_TOKEN_SHARED_CACHE_TTL = 5 * 60
+
+# Feed settings
+# Authors with more followers than this are not fanned out on write;
+# their posts are merged into followers' feeds at read time instead.
+FEED_FANOUT_FOLLOWER_LIMIT = int(os.getenv("FEED_FANOUT_FOLLOWER_LIMIT", 5000))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_POSTS = 20  # posts copied into a timeline on follow
+
+# Comment threads: each level adds 8 characters to Comment.path (max 255)
+COMMENT_MAX_DEPTH = 30
+
+# Posts per transaction in the bulk post import (endpoint and import_posts)
+POST_IMPORT_BATCH_SIZE = 500
+POST_IMPORT_MAX_LINES = 10000  # per request to the bulk endpoint
+
+# Trending settings (see posts/trending.py)
+TRENDING_HALF_LIFE_HOURS = 6  # a post's score halves every this many hours without new activity
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+TRENDING_MIN_SCORE = 0.1  # rows decayed below this are pruned
+
+# Follow graph settings
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 60  # seconds a user's follower/followee id set stays cached
+# A follow touches one suggestion row per followee of the followed user and per
+# follower of the follower; sides larger than this are skipped (see graph.py).
+FOLLOW_SUGGESTION_FANOUT_LIMIT = 5000
+
+# Notification settings
+NOTIFICATION_COALESCE_SECONDS = 24 * 60 * 60  # fold repeat events on one target within a day
+NOTIFICATION_RECENT_ACTORS = 3  # actors kept for "alice, bob and 40 others"
+# Pub/sub for the SSE stream. Notifications are delivered by the outbox
+# worker, a separate process, so only PostgresBroker (LISTEN/NOTIFY) pushes
+# them to streams in the web processes. With LocalBroker nothing is pushed
+# across processes and each stream only polls once per heartbeat.
+NOTIFICATION_BROKER = os.getenv(
+    "NOTIFICATION_BROKER",
+    "notifications.stream.PostgresBroker"
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+    else "notifications.stream.LocalBroker",
+)
+NOTIFICATION_STREAM_HEARTBEAT = 25  # seconds between keep-alives on an idle stream
+NOTIFICATION_STREAM_BATCH = 50
+NOTIFICATION_RETENTION_DAYS = 90  # read notifications older than this are archived
+
 # Security settings
 
 # Prevent XSS attacks by enabling the browser’s built-in XSS filter
@@ -21,4 +21,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')), 
     path('api/', include('posts.urls')),
+    path('api/', include('notifications.urls')),
 ]